@@ -24,42 +24,69 @@ SOFTWARE.
 """
 
 import logging
+import sys
 import traceback
-from configparser import ConfigParser
+from concurrent.futures import Future
 from datetime import datetime, timedelta
-from os import system, environ
+from multiprocessing import freeze_support
+from os import system, environ, getpid
 from pathlib import Path
 from platform import python_version, python_version_tuple
 from re import search
+from time import perf_counter
 
 import colorama
 import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
 import slack
-from matplotlib.gridspec import GridSpec
-from matplotlib.projections import register_projection
 from numpy import arange
 from selenium import webdriver
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as ec
-from selenium.webdriver.support.ui import WebDriverWait
 from termcolor import colored
 
 from ISA import InternationalStandardAtmosphere
+from archive import ForecastArchive
 from commandline import CommandLineParser
-from curvefit import PolynomialCurveFit, date2dhour
+from configstore import ConfigStore
+from curvefit import FixTimeMatrix, PolynomialCurveFit, date2dhour
 from forecast import Forecast
-from graph import NoPanXAxes, MyMatplotlibTools
+from ingest import MIN_POINTS, read_runs
+from metrics import METRICS, MetricsDumper, serve_metrics
+from queuelog import Lazy, start_queued_logging
+from sinks import SINKS, DirectoryDropSink, FileSink, RunResult, SinkFanOut, SlackSink, StdoutJsonSink, WebhookSink
+from stages import StagedExecutor
+from stations import StationIndex
+from graph import AltimeterFigure, BlitManager, render_image
 from translation import Translation
-from txttable import PredictionTable
+from txttable import PredictionTable, ROW_WRITERS
 from utils import (
     print80,
     nb_date_changes,
     pretty_polyid,
     cross_platform_leading_zeros_removal as no_leading_zeros,
-    cleanup_mei,
+    cleanup_mei_in_background,
+    output_path,
+)
+from wunderground import (
+    STATION_NAME_XPATH,
+    STATION_HEADER_XPATH,
+    STATION_ELEVATION_XPATH,
+    STATION_ELEVATION_LINE_XPATH,
+    PRESSURE_XPATH,
+    APP_STATE_ID,
+    HOURLY_TABLE_ID,
+    OBS_TIME_PATTERN,
+    NEXT_FORECASTS_XPATH,
+    BLOCKED_URL_PATTERNS,
+    EXTRACT_PAGE_SCRIPT,
+    WAIT_FOR_TABLE_SCRIPT,
+    extract_page_arguments,
+    detect_pressure_unit,
+    elevation_unit,
+    parse_hourly_row,
+    to_hectopascal,
+    to_meter,
 )
 
 _ = Translation()
@@ -68,18 +95,8 @@ FULLNAME = "DR Polynomial Altimeter"
 VERSION = "v1.1-alpha"  # TODO: change when ready to release
 DESCRIPTION = _("Altitude 'Dead Reckoning' for Casio Triple Sensor v.3")
 SHORTNAME = "DR-Altimeter"
-
-cleanup_mei()
-command_line_parser = CommandLineParser(
-    prog_path=Path(__file__), description=DESCRIPTION, shortname=SHORTNAME, version=VERSION,
-)
-_.set_lang(command_line_parser)
-args = command_line_parser.args
-command_line_parser.link_together(
-    args.latitude, args.longitude, _("If one is provided, both --latitude and --longitude must be provided"),
-)
-
-colorama.init()  # otherwise termcolor won't be fully included at compilation by pyinstaller
+MEI_CLEANUP_BUDGET = 5.0  # seconds, stale bundles left over are removed at next run
+LOG = logging.getLogger(SHORTNAME)  # program's own records: DEBUG (verbose dumps) never opens the root logger
 
 
 class Program:
@@ -94,7 +111,15 @@ class Program:
         "result",
         "forecast",
         "slack",
+        "START_TIME",
+        "LOG_FILENAME_T",
         "LOG_FILENAME",
+        "LOG_MAX_BYTES_T",
+        "LOG_MAX_BYTES",
+        "LOG_BACKUPS_T",
+        "LOG_BACKUPS",
+        "LOG_FORMAT_T",
+        "LOG_FORMAT",
         "CONFIG_FILENAME",
         "CS",
         "cfg",
@@ -104,6 +129,12 @@ class Program:
         "TIMEOUT_LONG",
         "GEOLOCATION_ALWAYS_ON_T",
         "GEOLOCATION_ALWAYS_ON",
+        "LEAN_BROWSER_T",
+        "LEAN_BROWSER",
+        "BLOCKED_URLS_T",
+        "BLOCKED_URLS",
+        "SWITCH_TO_METRIC_T",
+        "SWITCH_TO_METRIC",
         "WAIT_FOR_KEY_T",
         "WAIT_FOR_KEY",
         "PAUSE",
@@ -130,11 +161,38 @@ class Program:
         "SHOW_X_HOURS",
         "MIN_HOURS_T",
         "MIN_HOURS",
+        "BOOTSTRAP_RESAMPLES_T",
+        "BOOTSTRAP_RESAMPLES",
+        "BOOTSTRAP_CPU_BUDGET_T",
+        "BOOTSTRAP_CPU_BUDGET",
         "LATITUDE_T",
         "LATITUDE",
         "LONGITUDE_T",
         "LONGITUDE",
         "MISSING_LATLONG",
+        "ARCHIVE_FOLDER_T",
+        "ARCHIVE_FOLDER",
+        "STATION_LIST_T",
+        "STATION_LIST",
+        "METRICS_PORT_T",
+        "METRICS_PORT",
+        "METRICS_FILENAME_T",
+        "METRICS_FILENAME",
+        "METRICS_INTERVAL_T",
+        "METRICS_INTERVAL",
+        "OUTPUT_SINKS_T",
+        "OUTPUT_SINKS",
+        "DROP_FOLDER_T",
+        "DROP_FOLDER",
+        "WEBHOOK_URL_T",
+        "WEBHOOK_URL",
+        "FIX_MATRIX_HOURS_T",
+        "FIX_MATRIX_HOURS",
+        "FIX_MATRIX_EVERY_T",
+        "FIX_MATRIX_EVERY",
+        "FIX_MATRIX_FILENAME_T",
+        "FIX_MATRIX_FILENAME",
+        "STATION_INDEX",
         "browser",
     ]
 
@@ -157,31 +215,38 @@ class Program:
 
         self.start_console()
 
-        # starts logging
-        self.LOG_FILENAME = self.SHORTNAME + ".log"
-        logging.basicConfig(
-            filename=self.LOG_FILENAME,
-            level=logging.INFO,
-            filemode="w",
-            format="%(asctime)s %(levelname)s : %(message)s",
-            datefmt="%Y-%m-%d %H:%M",
-        )
+        self.START_TIME = datetime.now()
 
-        self.result = PredictionTable()
+        self.result = PredictionTable(stream=row_writer)
         self.forecast = Forecast()
-        self.slack = slack.WebClient(token=environ["SLACK_API_TOKEN"])
+        self.slack = slack.WebClient(token=environ.get("SLACK_API_TOKEN"))  # only needed by --slack
 
         # reads configuration file and recreates missing values
         self.CONFIG_FILENAME = "config.ini"
         self.CS = "USER SETTINGS"
-        self.cfg = ConfigParser()
-        self.cfg.read(self.CONFIG_FILENAME)
+        self.cfg = ConfigStore(self.CONFIG_FILENAME)
 
         if self.CS not in self.cfg.sections():
             print80(_("Regenerating {}").format(self.CONFIG_FILENAME))
             print()
             self.cfg.add_section(self.CS)
 
+        # starts logging
+        self.LOG_FILENAME_T = "log filename"
+        self.LOG_FILENAME = self.cfg.get(self.CS, self.LOG_FILENAME_T, fallback=self.SHORTNAME + ".log")
+        self.LOG_MAX_BYTES_T = "log max bytes"
+        self.LOG_MAX_BYTES = max(int(self.cfg.get(self.CS, self.LOG_MAX_BYTES_T, fallback="0")), 0)
+        self.LOG_BACKUPS_T = "log backups"
+        self.LOG_BACKUPS = max(int(self.cfg.get(self.CS, self.LOG_BACKUPS_T, fallback="3")), 1)
+        self.LOG_FORMAT_T = "log format"
+        self.LOG_FORMAT = self.cfg.get(self.CS, self.LOG_FORMAT_T, fallback="text")
+        start_queued_logging(
+            self.output_path(self.LOG_FILENAME),
+            json_format=self.LOG_FORMAT.strip().lower() == "json",
+            max_bytes=self.LOG_MAX_BYTES,
+            backups=self.LOG_BACKUPS,
+        )
+
         self.TIMEOUT_T = "short timeout"
         self.TIMEOUT = int(self.cfg.get(self.CS, self.TIMEOUT_T, fallback="5"))
 
@@ -191,6 +256,15 @@ class Program:
         self.GEOLOCATION_ALWAYS_ON_T = "geolocation always on"
         self.GEOLOCATION_ALWAYS_ON = bool(int(self.cfg.get(self.CS, self.GEOLOCATION_ALWAYS_ON_T, fallback="0")))
 
+        self.LEAN_BROWSER_T = "lean browser"
+        self.LEAN_BROWSER = bool(int(self.cfg.get(self.CS, self.LEAN_BROWSER_T, fallback="1")))
+
+        self.BLOCKED_URLS_T = "blocked url patterns"
+        self.BLOCKED_URLS = self.cfg.get(self.CS, self.BLOCKED_URLS_T, fallback=BLOCKED_URL_PATTERNS)
+
+        self.SWITCH_TO_METRIC_T = "switch to metric"
+        self.SWITCH_TO_METRIC = bool(int(self.cfg.get(self.CS, self.SWITCH_TO_METRIC_T, fallback="1")))
+
         self.WAIT_FOR_KEY_T = "press any key"
         self.WAIT_FOR_KEY = bool(int(self.cfg.get(self.CS, self.WAIT_FOR_KEY_T, fallback="1")))
         self.PAUSE = (not args.no_key) and self.WAIT_FOR_KEY
@@ -229,6 +303,7 @@ class Program:
         self.VERBOSE_T = "verbose"
         self.VERBOSE_ = bool(int(self.cfg.get(self.CS, self.VERBOSE_T, fallback="0")))
         self.VERBOSE = self.VERBOSE_ or args.verbose
+        LOG.setLevel(logging.DEBUG if self.VERBOSE else logging.INFO)  # libraries stay at the root level, INFO
 
         self.SHOW_X_HOURS_T = "display x hours"
         self.SHOW_X_HOURS = max(int(self.cfg.get(self.CS, self.SHOW_X_HOURS_T, fallback="6")), 1)
@@ -236,7 +311,46 @@ class Program:
         self.MIN_HOURS_T = "minimum hours"
         self.MIN_HOURS = max(int(self.cfg.get(self.CS, self.MIN_HOURS_T, fallback="8")), self.SHOW_X_HOURS,)
 
-        self.save_ini()  # save immediately to renew all required values
+        self.BOOTSTRAP_RESAMPLES_T = "bootstrap resamples"
+        self.BOOTSTRAP_RESAMPLES = max(int(self.cfg.get(self.CS, self.BOOTSTRAP_RESAMPLES_T, fallback="0")), 0)
+
+        self.BOOTSTRAP_CPU_BUDGET_T = "bootstrap cpu budget"
+        self.BOOTSTRAP_CPU_BUDGET = float(self.cfg.get(self.CS, self.BOOTSTRAP_CPU_BUDGET_T, fallback="2"))
+
+        self.ARCHIVE_FOLDER_T = "archive folder"
+        self.ARCHIVE_FOLDER = self.cfg.get(self.CS, self.ARCHIVE_FOLDER_T, fallback="")
+
+        self.STATION_LIST_T = "station list"
+        self.STATION_LIST = self.cfg.get(self.CS, self.STATION_LIST_T, fallback="")
+
+        self.METRICS_PORT_T = "metrics port"
+        self.METRICS_PORT = int(self.cfg.get(self.CS, self.METRICS_PORT_T, fallback="0"))
+
+        self.METRICS_FILENAME_T = "metrics filename"
+        self.METRICS_FILENAME = self.cfg.get(self.CS, self.METRICS_FILENAME_T, fallback="")
+
+        self.METRICS_INTERVAL_T = "metrics interval"
+        self.METRICS_INTERVAL = max(float(self.cfg.get(self.CS, self.METRICS_INTERVAL_T, fallback="60")), 1)
+
+        self.OUTPUT_SINKS_T = "output sinks"
+        self.OUTPUT_SINKS = self.cfg.get(self.CS, self.OUTPUT_SINKS_T, fallback="file, slack")
+
+        self.DROP_FOLDER_T = "drop folder"
+        self.DROP_FOLDER = self.cfg.get(self.CS, self.DROP_FOLDER_T, fallback="")
+
+        self.WEBHOOK_URL_T = "webhook url"
+        self.WEBHOOK_URL = self.cfg.get(self.CS, self.WEBHOOK_URL_T, fallback="")
+
+        self.FIX_MATRIX_HOURS_T = "fix matrix hours"
+        self.FIX_MATRIX_HOURS = max(float(self.cfg.get(self.CS, self.FIX_MATRIX_HOURS_T, fallback="0")), 0)
+
+        self.FIX_MATRIX_EVERY_T = "fix matrix every"
+        self.FIX_MATRIX_EVERY = max(int(self.cfg.get(self.CS, self.FIX_MATRIX_EVERY_T, fallback="5")), 1)
+
+        self.FIX_MATRIX_FILENAME_T = "fix matrix filename"
+        self.FIX_MATRIX_FILENAME = self.cfg.get(self.CS, self.FIX_MATRIX_FILENAME_T, fallback="fix-matrix.csv")
+
+        self.save_ini()  # save immediately to renew missing required values, if any
 
         # optional values that can be missing
         self.LATITUDE_T = "latitude"
@@ -256,7 +370,17 @@ class Program:
 
         self.MISSING_LATLONG = self.LATITUDE is None or self.LONGITUDE is None
 
-        self.browser = ChromeBrowser()
+        self.STATION_INDEX = None
+        if self.STATION_LIST:
+            try:
+                self.STATION_INDEX = StationIndex.from_csv(self.STATION_LIST)
+            except (OSError, KeyError, ValueError):
+                print80(self.register_error(_("Unable to read the station list {}").format(self.STATION_LIST)))
+                print()
+
+        self.browser = ChromeBrowser(
+            lean=self.LEAN_BROWSER, blocked_urls=[u.strip() for u in self.BLOCKED_URLS.split(",") if u.strip()],
+        )
 
     def start_console(self):
         """
@@ -270,8 +394,8 @@ class Program:
         print()
 
         major, minor, patchlevel = map(int, python_version_tuple())
-        if major != 3 or minor < 6:
-            print80(_("{} works best with Python version 3.6 and above. Please consider updating.").format(self.NAME))
+        if major != 3 or minor < 8:
+            print80(_("{} works best with Python version 3.8 and above. Please consider updating.").format(self.NAME))
             print()
 
     def save_ini(self):
@@ -281,19 +405,52 @@ class Program:
         self.cfg.set(self.CS, self.TIMEOUT_LONG_T, str(self.TIMEOUT_LONG))
         self.cfg.set(self.CS, self.SHOW_X_HOURS_T, str(self.SHOW_X_HOURS))
         self.cfg.set(self.CS, self.MIN_HOURS_T, str(self.MIN_HOURS))
+        self.cfg.set(self.CS, self.BOOTSTRAP_RESAMPLES_T, str(self.BOOTSTRAP_RESAMPLES))
+        self.cfg.set(self.CS, self.BOOTSTRAP_CPU_BUDGET_T, str(self.BOOTSTRAP_CPU_BUDGET))
         self.cfg.set(self.CS, self.ANY_HTTPS_PAGE_T, self.ANY_HTTPS_PAGE)
         self.cfg.set(self.CS, self.GEOLOCATED_URL_T, self.GEOLOCATED_URL)
         self.cfg.set(self.CS, self.GEOLOCATION_ALWAYS_ON_T, str(int(self.GEOLOCATION_ALWAYS_ON)))
         self.cfg.set(self.CS, self.OVERRIDE_URL_T, str(self.OVERRIDE_URL_))
+        self.cfg.set(self.CS, self.STATION_LIST_T, self.STATION_LIST)
+        self.cfg.set(self.CS, self.ARCHIVE_FOLDER_T, self.ARCHIVE_FOLDER)
+        self.cfg.set(self.CS, self.OUTPUT_SINKS_T, self.OUTPUT_SINKS)
+        self.cfg.set(self.CS, self.METRICS_PORT_T, str(self.METRICS_PORT))
+        self.cfg.set(self.CS, self.METRICS_FILENAME_T, self.METRICS_FILENAME)
+        self.cfg.set(self.CS, self.METRICS_INTERVAL_T, str(self.METRICS_INTERVAL))
+        self.cfg.set(self.CS, self.DROP_FOLDER_T, self.DROP_FOLDER)
+        self.cfg.set(self.CS, self.WEBHOOK_URL_T, self.WEBHOOK_URL)
+        self.cfg.set(self.CS, self.FIX_MATRIX_HOURS_T, str(self.FIX_MATRIX_HOURS))
+        self.cfg.set(self.CS, self.FIX_MATRIX_EVERY_T, str(self.FIX_MATRIX_EVERY))
+        self.cfg.set(self.CS, self.FIX_MATRIX_FILENAME_T, self.FIX_MATRIX_FILENAME)
+        self.cfg.set(self.CS, self.LEAN_BROWSER_T, str(int(self.LEAN_BROWSER)))
+        self.cfg.set(self.CS, self.BLOCKED_URLS_T, self.BLOCKED_URLS)
+        self.cfg.set(self.CS, self.SWITCH_TO_METRIC_T, str(int(self.SWITCH_TO_METRIC)))
         self.cfg.set(self.CS, self.WAIT_FOR_KEY_T, str(int(self.WAIT_FOR_KEY)))
         self.cfg.set(self.CS, self.GRAPH_FILENAME_T, self.GRAPH_FILENAME)
+        self.cfg.set(self.CS, self.LOG_FILENAME_T, self.LOG_FILENAME)
+        self.cfg.set(self.CS, self.LOG_MAX_BYTES_T, str(self.LOG_MAX_BYTES))
+        self.cfg.set(self.CS, self.LOG_BACKUPS_T, str(self.LOG_BACKUPS))
+        self.cfg.set(self.CS, self.LOG_FORMAT_T, self.LOG_FORMAT)
         self.cfg.set(self.CS, self.GRAPH_DPI_T, str(self.GRAPH_DPI))
         self.cfg.set(self.CS, self.GRAPH_ORIENTATION_T, self.GRAPH_ORIENTATION)
         self.cfg.set(self.CS, self.GRAPH_PAPERTYPE_T, self.GRAPH_PAPERTYPE)
         # fmt: on
 
-        with open(self.CONFIG_FILENAME, "w") as configfile:
-            self.cfg.write(configfile)
+        self.cfg.save()  # only if a value changed
+
+    def output_path(self, template: str, fix_hour: datetime = None) -> str:
+        """
+        :param template: filename with optional {station}, {fix_time}, {start_time} and {pid} placeholders
+        :param fix_hour: fix time, once known
+        :return: filename specific to this run
+        """
+        return output_path(
+            template,
+            station=self.STATION_NAME or _("UNKNOWN"),
+            fix_time=(fix_hour or self.START_TIME).strftime("%Y%m%d-%H%M"),
+            start_time=self.START_TIME.strftime("%Y%m%d-%H%M%S"),
+            pid=getpid(),
+        )
 
     def save_lat_lon(self, pos):
         self.cfg.set(self.CS, self.LATITUDE_T, str(pos["latitude"]))
@@ -306,18 +463,32 @@ class Program:
         logging.info("{:.7f} {:.7f} ±{}m".format(pos["latitude"], pos["longitude"], pos["accuracy"]))
         print()
 
+    def nearest_station_url(self, latitude: float, longitude: float) -> str:
+        _name, _url, _km = self.STATION_INDEX.nearest(latitude, longitude)
+        print80(self.register_info(_("Nearest station in {} : {} ({:.1f} km)").format(self.STATION_LIST, _name, _km)))
+        print()
+        return _url
+
     def hourly_forecast_url(self):
-        if self.GEOLOCATION_ALWAYS_ON or (self.MISSING_LATLONG and not self.OVERRIDE_URL_EXISTS):
+        if self.STATION_INDEX is not None and not self.MISSING_LATLONG and not self.OVERRIDE_URL_EXISTS:
+
+            # last known position, no browser needed, even with geolocation always on
+            _hourly_forecast_url = self.nearest_station_url(self.LATITUDE, self.LONGITUDE)
+
+        elif self.GEOLOCATION_ALWAYS_ON or (self.MISSING_LATLONG and not self.OVERRIDE_URL_EXISTS):
 
             self.browser.go_to(webpage=self.ANY_HTTPS_PAGE, geolocation=True)
             position = self.browser.get_lat_lon()
             self.save_lat_lon(pos=position)
             self.browser.quit()
 
-            #  decreased precision (3 digits instead of 7) to partially preserve anonymity
-            _hourly_forecast_url = self.GEOLOCATED_URL + "{:.3f},{:.3f}".format(
-                position["latitude"], position["longitude"]
-            )
+            if self.STATION_INDEX is not None:
+                _hourly_forecast_url = self.nearest_station_url(position["latitude"], position["longitude"])
+            else:
+                #  decreased precision (3 digits instead of 7) to partially preserve anonymity
+                _hourly_forecast_url = self.GEOLOCATED_URL + "{:.3f},{:.3f}".format(
+                    position["latitude"], position["longitude"]
+                )
 
         elif self.OVERRIDE_URL_EXISTS:
 
@@ -348,11 +519,25 @@ class Program:
 
         print80(_("Connected to Wunderground"))
 
+    def wait_for_table(self, timeout: int, required_text: str = None, click_xpath: str = None) -> float:
+        """
+        Blocks until the page itself signals that the hourly table is ready (no polling from Python)
+
+        :param timeout: seconds before TimeoutException is raised
+        :param required_text: text the table must contain
+        :param click_xpath: button to click, after which the table must change
+        :return: measured wait, in milliseconds
+        """
+        self.browser.driver.set_script_timeout(timeout)
+        _start = perf_counter()
+        self.browser.driver.execute_async_script(WAIT_FOR_TABLE_SCRIPT, HOURLY_TABLE_ID, required_text, click_xpath)
+        _waited = (perf_counter() - _start) * 1000
+        self.register_info(_("Hourly table ready after {:.0f} ms").format(_waited))
+        return _waited
+
     def wait_until_page_is_loaded(self):
         try:
-            WebDriverWait(self.browser.driver, self.TIMEOUT).until(
-                ec.presence_of_element_located((By.ID, "hourly-forecast-table"))
-            )
+            self.wait_for_table(self.TIMEOUT)
             print80(_("Page is ready"))
         except TimeoutException:
             raise TimeoutException(_("Page took too much time to load"))
@@ -362,43 +547,67 @@ class Program:
         self.browser.driver.find_element_by_id("wuSettings").click()
         self.browser.driver.find_element_by_css_selector("[title^='Switch to Metric'").click()
         try:
-            WebDriverWait(self.browser.driver, self.TIMEOUT_LONG).until(
-                ec.text_to_be_present_in_element((By.ID, "hourly-forecast-table"), "hPa")
-            )
+            self.wait_for_table(self.TIMEOUT_LONG, required_text="hPa")
         except TimeoutException:
             raise TimeoutException(_("Unable to switch to metric"))
 
     def click_next(self):
-        self.browser.driver.find_element_by_xpath('//*[@id="nextForecasts"]/span[2]/button').click()
+        try:
+            self.wait_for_table(self.TIMEOUT, click_xpath=NEXT_FORECASTS_XPATH)
+        except TimeoutException:
+            raise TimeoutException(_("Page took too much time to load"))
+
+    def extract_page(self):
+        """
+        Collects station, elevation, observation time, current pressure and hourly rows in one round trip
 
-    def get_station_name(self):
+        :return: dict of raw texts, or None to fall back to the per-element path
+        """
         try:
-            _elem = self.browser.driver.find_element_by_xpath(
-                '//*[@id="inner-content"]/div[2]/lib-city-header/div[1]/div/div/a[1]'
-            )
-            _st = search("^-?[0-9]* (.*)$", _elem.text)
+            _page = self.browser.driver.execute_script(EXTRACT_PAGE_SCRIPT, *extract_page_arguments())
+        except WebDriverException:
+            _page = None
+
+        if not isinstance(_page, dict) or not _page.get("rows"):
+            _msg = self.register_error(_("Page extraction script failed, reading elements one by one"))
+            if self.VERBOSE:
+                print80(_msg)
+            return None
+
+        return _page
+
+    def find_text(self, page, key: str, xpath: str) -> str:
+        """
+        Text of an element, taken from the extracted page when available
+
+        :param page: dict returned by extract_page(), or None
+        :param key: key of the element in the extracted page
+        :param xpath: location of the element in the page
+        :return: text of the element
+        """
+        if page is None:
+            return self.browser.driver.find_element_by_xpath(xpath).text
+        if page.get(key) is None:
+            raise NoSuchElementException(xpath)
+        return page[key]
+
+    def get_station_name(self, page=None):
+        try:
+            _st = search("^-?[0-9]* (.*)$", self.find_text(page, "station", STATION_NAME_XPATH))
             self.STATION_NAME = _st.group(1).strip()
         except NoSuchElementException:
             print80(self.register_error(_("Station name not found")))
         if self.STATION_NAME is None or self.STATION_NAME == "STATION":
             try:
-                _elem = self.browser.driver.find_element_by_xpath(
-                    '//*[@id="inner-content"]/div[2]/lib-city-header/div[1]/div/h1'
-                )
-                self.STATION_NAME = _elem.text[:20].lstrip(", ") + "..."
+                self.STATION_NAME = self.find_text(page, "header", STATION_HEADER_XPATH)[:20].lstrip(", ") + "..."
             except NoSuchElementException:
                 self.STATION_NAME = _("UNKNOWN")
         logging.info(self.STATION_NAME)
         print()
         print80(colored(self.STATION_NAME, attrs=["bold"]))
 
-    def get_atm_pressure_at_station(self):
-        _elem = self.browser.driver.find_element_by_xpath(
-            '//*[@id="inner-content"]/div[3]/div[2]/div/div[1]'
-            "/div[1]/lib-additional-conditions/lib-item-box/div/"
-            "div[2]/div/div[1]/div[2]/lib-display-unit/span/span[1]"
-        )
-        self.P_INITIAL = float(_elem.text)
+    def get_atm_pressure_at_station(self, page=None):
+        self.P_INITIAL = to_hectopascal(float(self.find_text(page, "pressure", PRESSURE_XPATH).replace(",", "")))
         print80(
             self.register_info(
                 _("Current atmospheric pressure : {} hPa (ISA={:0.1f}m)").format(
@@ -408,21 +617,23 @@ class Program:
         )
         return self.P_INITIAL
 
-    def get_obs_time(self):
-        _elem = self.browser.driver.find_element(By.XPATH, '//*[@id="app-root-state"]')
-        _st = search("obsTimeLocal&q;:&q;(....-..-.. ..:..:..)&q;", _elem.get_attribute("innerHTML"),)
-        if _st is not None:
-            return datetime.strptime(_st.group(1), "%Y-%m-%d %H:%M:%S")
+    def get_obs_time(self, page=None):
+        if page is not None:
+            _obs_time = page.get("obs_time")
+        else:
+            _elem = self.browser.driver.find_element(By.ID, APP_STATE_ID)
+            _st = search(OBS_TIME_PATTERN, _elem.get_attribute("innerHTML"))
+            _obs_time = _st.group(1) if _st is not None else None
+        if _obs_time is not None:
+            return datetime.strptime(_obs_time, "%Y-%m-%d %H:%M:%S")
         else:
             print80(self.register_error(_("Observation time not found.")))
             return datetime.now()
 
-    def get_station_elevation(self):
+    def get_station_elevation(self, page=None):
         try:
-            _elem = self.browser.driver.find_element(
-                By.XPATH, '//*[@id="inner-content"]/div[2]' "/lib-city-header/div[1]/div/span/span/strong",
-            )
-            self.ELEVATION = int(_elem.text)
+            _elevation = float(self.find_text(page, "elevation", STATION_ELEVATION_XPATH).replace(",", ""))
+            self.ELEVATION = int(round(to_meter(_elevation, self.get_elevation_unit(page))))
         except NoSuchElementException:
             print80(self.register_error(_("Elevation not found. Assuming it to be zero")))
             self.ELEVATION = 0
@@ -434,35 +645,229 @@ class Program:
             )
         )
 
+    def get_elevation_unit(self, page=None) -> str:
+        """
+        'm' or 'ft', as shown next to the elevation or, failing that, deduced from the current pressure unit
+        """
+        try:
+            _line = self.find_text(page, "elevation_line", STATION_ELEVATION_LINE_XPATH)
+        except NoSuchElementException:
+            _line = None
+        try:
+            _pressure = float(self.find_text(page, "pressure", PRESSURE_XPATH).replace(",", ""))
+            _pressure_unit = detect_pressure_unit(_pressure)
+        except (NoSuchElementException, ValueError):
+            _pressure_unit = "hPa"
+        return elevation_unit(_line, pressure_unit=_pressure_unit)
+
+    def get_hourly_rows(self, page=None) -> list:
+        if page is not None:
+            return page["rows"]
+        return self.browser.driver.find_element(By.ID, HOURLY_TABLE_ID).text.split("\n")
+
+    @staticmethod
+    def full_hours(times: list):
+        """
+        :param times: forecast times, in chronological order
+        :return: full hour of the first time, every full hour between it and the last time
+        """
+        start_full_hour = times[0].replace(microsecond=0, second=0, minute=0)
+        end_full_hour = times[-1].replace(microsecond=0, second=0, minute=0)
+        middle_full_hours = arange(
+            start_full_hour + timedelta(hours=1), end_full_hour, timedelta(hours=1)
+        ).astype(datetime)
+        return start_full_hour, middle_full_hours
+
+    def fill_table(self, curvefit, times: list, start_full_hour, middle_full_hours):
+        """
+        One row for the observation, one per full hour and one for the last forecast, with the step changes
+        of each hour. curvefit.compute_steps() must be called first.
+        """
+        self.result.add_start(
+            hour=times[0].hour,
+            minute=times[0].minute,
+            pressure=self.P_INITIAL,
+            times=[curvefit.step_text(start_full_hour)],
+        )
+        previous_pressure = self.P_INITIAL
+
+        for loop_hour in middle_full_hours:
+            if loop_hour in times:
+
+                this_pressure = self.forecast.get_pressure(loop_hour)
+                self.result.add(
+                    hour=loop_hour.hour,
+                    pressure=this_pressure,
+                    alt=self.forecast.get_delta_altitude(loop_hour, p_ref=self.P_INITIAL),
+                    alt_h=self.forecast.get_delta_altitude(loop_hour, p_ref=previous_pressure),
+                    times=[curvefit.step_text(loop_hour)],
+                )
+                previous_pressure = this_pressure
+
+            else:
+                self.result.add(
+                    hour=loop_hour.hour, pressure=None, alt=None, alt_h=None, times=[curvefit.step_text(loop_hour)],
+                )
+
+        self.result.add(
+            hour=times[-1].hour,
+            pressure=self.forecast.get_pressure(times[-1]),
+            alt=self.forecast.get_delta_altitude(times[-1], p_ref=self.P_INITIAL),
+            alt_h=self.forecast.get_delta_altitude(times[-1], p_ref=previous_pressure),
+            times=[],
+        )
+
+    def process_offline(self, source: str, lang: str = None) -> tuple:
+        """
+        Forecast -> fit -> table for every run read from source, without browser nor network.
+        Runs are read, processed and forgotten one at a time, so memory does not grow with the source.
+        A run that cannot be fitted is logged and skipped, the others go on.
+
+        :param source: CSV file, JSON lines file, archive folder, or - for the standard input (see ingest.py)
+        :param lang: language of the tables and messages, ex) 'fr', None = the current language
+        :return: number of runs processed, number of runs skipped
+        """
+        with _.language(lang):
+            processed = skipped = 0
+            for run in read_runs(source):
+                if len(run.forecast) < MIN_POINTS:
+                    _msg = _("{} {} skipped: not enough forecast points").format(run.station, run.run)
+                    print80(self.register_error(_msg))
+                    skipped += 1
+                    continue
+
+                self.STATION_NAME, self.ELEVATION, self.P_INITIAL = run.station, run.elevation, run.p_initial
+                self.forecast = run.forecast
+                self.forecast.reorder_chronologically()
+                self.result = PredictionTable(stream=self.result.stream)
+                if self.result.stream is not None:
+                    self.result.stream.tag = {"station": run.station, "run": run.run.isoformat(timespec="seconds")}
+
+                # noinspection PyBroadException
+                try:
+                    times = self.forecast.times()
+                    start_full_hour, middle_full_hours = self.full_hours(times)
+                    x = [date2dhour(start_full_hour, t) for t in times]
+                    y = self.forecast.delta_altitudes(p_ref=self.P_INITIAL)
+                    with METRICS.timer("fit_seconds", "Polynomial curve fit, degree selection included"):
+                        curvefit = PolynomialCurveFit(x, y)
+                    METRICS.inc("fit_degree_total", "Chosen polynomial degrees", degree=curvefit.degree)
+                    curvefit.compute_steps(ref_hour=start_full_hour, start=times[0], fix_hour=run.run)
+                except Exception:
+                    logging.error(traceback.format_exc())
+                    print80(self.register_error(_("{} {} skipped: no curve fit").format(run.station, run.run)))
+                    skipped += 1
+                    continue
+
+                print80(self.register_info("{} ― {}".format(run.station, run.run.strftime("%Y.%m.%d %H:%M"))))
+                self.fill_table(curvefit, times, start_full_hour, middle_full_hours)
+                self.display_results()
+                processed += 1
+
+            print80(self.register_info(_("{} runs processed, {} skipped").format(processed, skipped)))
+            return processed, skipped
+
     def display_results(self):
         _txt = (
             self.result.display_table()
             + "\n==============================================================================="
         )
-        logging.info("\n\n" + _txt)
+        logging.info("\n\n%s", _txt)
         print(_txt)
 
-    def send_to_slack(self, _fix_hour):
-        _txt = self.result.display_table()
-        _title = "{}-{:}".format(self.STATION_NAME, _fix_hour.strftime("%Y%m%d-%H%M")).replace(" ", "_")
-        _comment = "{} ({}m)\n\n".format(self.STATION_NAME, self.ELEVATION)
+    def archive_run(self, fix_hour, curvefit, ref_hour):
         try:
-            print80(_("Sending timetable to Slack channel {}").format(args.slack))
-            _response = self.slack.files_upload(
-                content=_txt, channels=args.slack, title=_title, filename=_title + ".txt", initial_comment=_comment,
+            ForecastArchive(self.ARCHIVE_FOLDER).append(
+                station=self.STATION_NAME,
+                run=fix_hour,
+                forecast=self.forecast,
+                curvefit=curvefit,
+                ref_hour=ref_hour,
+                p_initial=self.P_INITIAL,
+                elevation=self.ELEVATION,
             )
-            assert _response["ok"]
-            print80(_("Sending {} to Slack channel {}").format(program.GRAPH_FILENAME, args.slack))
-            _response = self.slack.files_upload(
-                file=program.GRAPH_FILENAME,
-                channels=args.slack,
-                title=_title,
-                filename=_title + "." + program.GRAPH_FILENAME.split(".")[-1],
-                initial_comment=_comment,
+        except OSError:
+            print80(self.register_error(_("Unable to archive this forecast in {}").format(self.ARCHIVE_FOLDER)))
+
+    def save_fix_matrix(self, fix_hour, curvefit, ref_hour, start):
+        """
+        Step schedules and hourly corrections for every fix time over the next 'fix matrix hours',
+        from the same curve fit, for a watch calibrated later than now
+        """
+        with METRICS.timer("fix_matrix_seconds", "Fix-time matrix, from the curve fit to the file"):
+            matrix = FixTimeMatrix(
+                curvefit, ref_hour, start, first_fix=fix_hour, hours=self.FIX_MATRIX_HOURS, every=self.FIX_MATRIX_EVERY,
             )
-            assert _response["ok"]
-        except AssertionError:
-            print80(self.register_error(_("Sending to Slack failed")))
+            filename = self.output_path(self.FIX_MATRIX_FILENAME, fix_hour)
+            try:
+                matrix.save(filename)
+            except OSError:
+                print80(self.register_error(_("Unable to save the fix-time matrix in {}").format(filename)))
+                return
+        if self.VERBOSE:
+            print80(
+                self.register_info(
+                    _("Fix-time matrix : {} fix times, {} step changes, in {}").format(
+                        len(matrix.fix_minutes), len(matrix.change_minutes), filename
+                    )
+                )
+            )
+            print()
+
+    def display_step_bands(self, bands):
+        _msg = _("Step changes, {:g}% of {} resampled fits between :").format(bands["coverage"], bands["resamples"])
+        print80(self.register_info(_msg))
+        _txt = ", ".join(
+            "{}[{}] {}-{}".format(
+                no_leading_zeros(_time.strftime("#%Hh%M")),
+                _step,
+                no_leading_zeros(_earliest.strftime("#%Hh%M")),
+                no_leading_zeros(_latest.strftime("#%Hh%M")),
+            )
+            for _time, _step, _earliest, _latest in bands["steps"]
+        )
+        print80(self.register_info(_txt))
+        print()
+
+    def start_metrics(self):
+        """
+        Serves /metrics (Prometheus text) on the metrics port, if any, and dumps a JSON snapshot periodically
+        to the metrics file, if any
+
+        :return: the MetricsDumper to stop at the end, or None
+        """
+        if self.METRICS_PORT:
+            try:
+                serve_metrics(METRICS, self.METRICS_PORT)
+                print80(self.register_info(_("Metrics on http://127.0.0.1:{}/metrics").format(self.METRICS_PORT)))
+            except OSError:
+                print80(self.register_error(_("Unable to serve metrics on port {}").format(self.METRICS_PORT)))
+        if self.METRICS_FILENAME:
+            return MetricsDumper(METRICS, self.output_path(self.METRICS_FILENAME), self.METRICS_INTERVAL)
+        return None
+
+    def output_sinks(self) -> list:
+        """ :return: the output sinks listed in the configuration, among those usable in this run """
+        _sinks = []
+        for _name in [_n.strip() for _n in self.OUTPUT_SINKS.split(",") if _n.strip()]:
+            if _name not in SINKS:
+                print80(self.register_error(_("Unknown output sink {}").format(_name)))
+            elif _name == FileSink.name:
+                _sinks.append(FileSink(lambda result: self.output_path(self.GRAPH_FILENAME, result.fix_hour)))
+            elif _name == DirectoryDropSink.name and self.DROP_FOLDER:
+                try:
+                    _sinks.append(DirectoryDropSink(self.DROP_FOLDER))
+                except OSError:
+                    print80(self.register_error(_("Unable to use the drop folder {}").format(self.DROP_FOLDER)))
+            elif _name == StdoutJsonSink.name and args.output in ROW_WRITERS:  # one stdout, one kind of document
+                print80(self.register_error(_("Output sink json ignored: --output {} uses stdout").format(args.output)))
+            elif _name == StdoutJsonSink.name:
+                _sinks.append(StdoutJsonSink())
+            elif _name == WebhookSink.name and self.WEBHOOK_URL:
+                _sinks.append(WebhookSink(self.WEBHOOK_URL))
+            elif _name == SlackSink.name and args.slack is not None:
+                _sinks.append(SlackSink(self.slack, args.slack))
+        return _sinks
 
     @staticmethod
     def register_info(msg):
@@ -478,23 +883,55 @@ class Program:
 class ChromeBrowser:
     """ Controls *chromedriver.exe* """
 
-    __slots__ = ["options", "driver"]
+    __slots__ = ["options", "driver", "lean", "blocked_urls"]
 
-    def __init__(self):
+    def __init__(self, lean: bool = False, blocked_urls: list = None):
+        """
+        :param lean: hidden (scraping) pages load without images, media, fonts, ads and trackers
+        :param blocked_urls: URL patterns never requested by the lean profile
+        """
         self.options = Options()
         self._listening_on_disabled()
         self.driver = None
+        self.lean = lean
+        self.blocked_urls = blocked_urls if blocked_urls is not None else []
 
     def _listening_on_disabled(self):
         self.options.add_argument("--log-level=3")
         self.options.add_experimental_option("excludeSwitches", ["enable-logging"])
 
+    def _lean_profile(self) -> dict:
+        """
+        Returns control as soon as the DOM is ready and skips everything the hourly table does not need
+
+        :return: content settings to add to the Chrome preferences
+        """
+        self.options.set_capability("pageLoadStrategy", "eager")
+        self.options.add_argument("--disable-extensions")
+        self.options.add_argument("--disable-gpu")
+        self.options.add_argument("--blink-settings=imagesEnabled=false")
+        return {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.managed_default_content_settings.media_stream": 2,
+            "profile.managed_default_content_settings.plugins": 2,
+            "profile.managed_default_content_settings.popups": 2,
+            "profile.managed_default_content_settings.notifications": 2,
+        }
+
     def go_to(self, webpage: Path, hidden: bool = False, geolocation: bool = False):
         """ Open browser """
-        self.options.add_experimental_option("prefs", {"geolocation": geolocation})
+        prefs = {"geolocation": geolocation}
+        lean = self.lean and hidden and not geolocation
+        if lean:
+            prefs.update(self._lean_profile())
+        self.options.add_experimental_option("prefs", prefs)
         if hidden and not geolocation:  # geolocation only works if not headless
             self.options.add_argument("--headless")
-        self.driver = webdriver.Chrome(options=self.options)
+        with METRICS.timer("chrome_launch_seconds", "Chrome start-up", lean=int(lean)):
+            self.driver = webdriver.Chrome(options=self.options)
+        if lean and self.blocked_urls:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.blocked_urls})
         self.driver.get(webpage)
 
     def close_window(self):
@@ -520,332 +957,305 @@ class ChromeBrowser:
 #  MAIN
 # =====================================================================
 
-program = Program(fullname=FULLNAME, version=VERSION, description=_(DESCRIPTION), shortname=SHORTNAME)
-isa = InternationalStandardAtmosphere()
-
-# noinspection PyBroadException
-try:
-    # ----------------------------------------------------------------------
-    # SCRUB HOURLY PREDICTION ON WUNDERGROUND
-    # ----------------------------------------------------------------------
-    hourly_forecast_url = program.hourly_forecast_url()
-
-    first_day = datetime.today()
-    same_day = 1
-    if datetime.now().hour == 23:  # https://github.com/Wlodarski/DR-Altimeter/issues/6
-        first_day += timedelta(days=1)
-        same_day = 0
-    last_day = first_day + timedelta(hours=program.MIN_HOURS)
-    nth_days = range(0, same_day + nb_date_changes(first_day, last_day))
-    dates = [first_day.date() + timedelta(days=day) for day in nth_days]
-
-    first_page = True
-    for d in dates:
-        date_str = d.strftime("%Y-%m-%d")
-        url = hourly_forecast_url + "/date/" + date_str
-        if program.VERBOSE:
-            print80(url)
-        if first_page:
-            program.browser.go_to(webpage=url, hidden=True)
-            program.check_page(title="Hourly Weather Forecast | Weather Underground")
-            program.wait_until_page_is_loaded()
-            program.switch_to_metric()
-            first_page = False
-        else:
-            program.click_next()
-
-        if program.STATION_NAME is None:
-            program.get_station_name()
-        if program.ELEVATION is None:
-            program.get_station_elevation()
-        if program.P_INITIAL is None:
-            program.forecast.add(time=program.get_obs_time(), pressure=program.get_atm_pressure_at_station())
-            print()
-
-        elem = program.browser.driver.find_element(By.ID, "hourly-forecast-table")
-        for row in elem.text.split("\n"):
-            if not row.startswith("Time"):  # skips the header row, which starts with the word Time
-
-                # parsing out hour and predicted pressure
-                st = search("^([0-9]+:00 [ap]m).* (.*) hPa$", row)
-                hour = datetime.strptime(date_str + " " + st.group(1), "%Y-%m-%d %I:%M %p")
-                pressure = float(st.group(2).replace(",", ""))
-                program.forecast.add(time=hour, pressure=pressure)
-
-    program.browser.quit()
-
-    # ----------------------------------------------------------------------
-    # TRANSLATE PREDICTED PRESSURE INTO PREDICTED ALTITUDE CHANGES
-    # ----------------------------------------------------------------------
-
-    program.forecast.reorder_chronologically()  # superfluous but doing anyway, just in case
-
-    fix_hour = datetime.now()  # fix hour set at this specific execution time : after scrub is done
+if __name__ == "__main__":
+    freeze_support()  # frozen executable: lets graph rendering worker processes start
 
-    times = program.forecast.times()
-    start = times[0]
-    end = times[-1]
-    start_full_hour = start.replace(microsecond=0, second=0, minute=0)
-    end_full_hour = end.replace(microsecond=0, second=0, minute=0)
-    middle_full_hours = arange(start_full_hour + timedelta(hours=1), end_full_hour, timedelta(hours=1)).astype(datetime)
+    cleanup_mei_in_background(budget=MEI_CLEANUP_BUDGET)
+    command_line_parser = CommandLineParser(
+        prog_path=Path(__file__), description=DESCRIPTION, shortname=SHORTNAME, version=VERSION,
+    )
+    _.set_lang(command_line_parser)
+    args = command_line_parser.args
+    command_line_parser.link_together(
+        args.latitude, args.longitude, _("If one is provided, both --latitude and --longitude must be provided"),
+    )
 
-    x = [date2dhour(start_full_hour, t) for t in program.forecast.times()]  # time since start
-    y = program.forecast.delta_altitudes(p_ref=program.P_INITIAL)  # altitude change
-    z = program.forecast.pressures()  # predicted atmospheric pressure
+    colorama.init()  # otherwise termcolor won't be fully included at compilation by pyinstaller
 
-    # ----------------------------------------------------------------------
-    # POLYNOMIAL CURVE FIT
-    # ----------------------------------------------------------------------
+    row_writer = None
+    if args.output in ROW_WRITERS:
+        row_writer = ROW_WRITERS[args.output](sys.stdout, tagged=args.from_file is not None)
+        sys.stdout = sys.stderr  # console messages must not mix with machine-readable results
 
-    if program.VERBOSE:
-        print(program.register_info(_(" POLYNOMIAL CURVE FIT ").center(79, "=")))
-        print()
-
-    curvefit = PolynomialCurveFit(x, y)
+    program = Program(fullname=FULLNAME, version=VERSION, description=_(DESCRIPTION), shortname=SHORTNAME)
+    isa = InternationalStandardAtmosphere()
+    metrics_dumper = program.start_metrics()
 
-    if program.VERBOSE:
-        formula = pretty_polyid(
-            polynomial=curvefit.poly, f_text=_("altitude(time)"), var_symbol=_("time"), equal_sign="=",
-        )
-        print80(program.register_info(_("Degree : {}").format(curvefit.degree)))
-        print()
-        print80(program.register_info(_("Coefficients : {}").format(curvefit.poly)))
-        print()
-        print80(program.register_info(_("Time vector (x) : {}").format(x)))
-        print()
-        print80(program.register_info(_("Altitude vector (y) : {}").format(y)))
-        print()
-        print80(program.register_info(_("Pressure vector (z) : {}").format(z)))
-        print()
-        print(program.register_info("\n{}\n".format(formula)))
-        print(program.register_info("".center(79, "-")))
-        print()
+    if args.from_file is not None:  # offline: forecast rows read from a file, no browser, no network
+        # noinspection PyBroadException
+        try:
+            program.process_offline(args.from_file)
+        except Exception:
+            logging.error(traceback.format_exc())
+            traceback.print_exc()
+            sys.exit(1)
+        finally:
+            if metrics_dumper is not None:
+                metrics_dumper.stop()
+        sys.exit()
+
+    # noinspection PyBroadException
+    try:
+        # ----------------------------------------------------------------------
+        # SCRUB HOURLY PREDICTION ON WUNDERGROUND
+        # ----------------------------------------------------------------------
+        hourly_forecast_url = program.hourly_forecast_url()
+
+        first_day = datetime.today()
+        same_day = 1
+        if datetime.now().hour == 23:  # https://github.com/Wlodarski/DR-Altimeter/issues/6
+            first_day += timedelta(days=1)
+            same_day = 0
+        last_day = first_day + timedelta(hours=program.MIN_HOURS)
+        nth_days = range(0, same_day + nb_date_changes(first_day, last_day))
+        dates = [first_day.date() + timedelta(days=day) for day in nth_days]
+
+        first_page = True
+        for d in dates:
+            date_str = d.strftime("%Y-%m-%d")
+            url = hourly_forecast_url + "/date/" + date_str
+            if program.VERBOSE:
+                print80(url)
+            page_start = perf_counter()
+            page_kind = "first" if first_page else "next"
+            if first_page:
+                program.browser.go_to(webpage=url, hidden=True)
+                program.check_page(title="Hourly Weather Forecast | Weather Underground")
+                program.wait_until_page_is_loaded()
+                if program.VERBOSE:
+                    page_ready = (perf_counter() - page_start) * 1000
+                    if program.LEAN_BROWSER:
+                        print80(program.register_info(_("Page ready in {:.0f} ms (lean browser)").format(page_ready)))
+                    else:
+                        print80(program.register_info(_("Page ready in {:.0f} ms (full browser)").format(page_ready)))
+                if program.SWITCH_TO_METRIC:
+                    program.switch_to_metric()
+                first_page = False
+            else:
+                program.click_next()
+
+            page = program.extract_page()
+            if program.STATION_NAME is None:
+                program.get_station_name(page)
+            if program.ELEVATION is None:
+                program.get_station_elevation(page)
+            if program.P_INITIAL is None:
+                program.forecast.add(
+                    time=program.get_obs_time(page), pressure=program.get_atm_pressure_at_station(page)
+                )
+                print()
 
-    # ----------------------------------------------------------------------
-    # TEXT OUTPUT
-    # ----------------------------------------------------------------------
+            for row in program.get_hourly_rows(page):
+                if not row.startswith("Time"):  # skips the header row, which starts with the word Time
 
-    curvefit.compute_steps(ref_hour=start_full_hour, start=start, fix_hour=fix_hour)
+                    # parsing out hour and predicted pressure, converted to hPa whatever the unit system
+                    hour, pressure = parse_hourly_row(row, date_str)
+                    program.forecast.add(time=hour, pressure=pressure)
 
-    program.result.add_start(
-        hour=start.hour, minute=start.minute, pressure=program.P_INITIAL, times=[curvefit.step_text(start_full_hour)],
-    )
-    previous_pressure = program.P_INITIAL
-
-    for loop_hour in middle_full_hours:
-        if loop_hour in times:
-
-            this_pressure = program.forecast.get_pressure(loop_hour)
-            program.result.add(
-                hour=loop_hour.hour,
-                pressure=this_pressure,
-                alt=program.forecast.get_delta_altitude(loop_hour, p_ref=program.P_INITIAL),
-                alt_h=program.forecast.get_delta_altitude(loop_hour, p_ref=previous_pressure),
-                times=[curvefit.step_text(loop_hour)],
+            METRICS.observe(
+                # fmt: off
+                "scrape_page_seconds", "Page scrape, from request to parsed rows",
+                perf_counter() - page_start, page=page_kind,
+                # fmt: on
             )
-            previous_pressure = this_pressure
 
-        else:
-            program.result.add(
-                hour=loop_hour.hour, pressure=None, alt=None, alt_h=None, times=[curvefit.step_text(loop_hour)],
-            )
+        program.browser.quit()
 
-    program.result.add(
-        hour=end.hour,
-        pressure=program.forecast.get_pressure(end),
-        alt=program.forecast.get_delta_altitude(end, p_ref=program.P_INITIAL),
-        alt_h=program.forecast.get_delta_altitude(end, p_ref=previous_pressure),
-        times=[],
-    )
+        # ----------------------------------------------------------------------
+        # TRANSLATE PREDICTED PRESSURE INTO PREDICTED ALTITUDE CHANGES
+        # ----------------------------------------------------------------------
 
-    program.display_results()
+        program.forecast.reorder_chronologically()  # superfluous but doing anyway, just in case
 
-    # --------------------------------------------------------------------------
-    # GRAPH
-    # --------------------------------------------------------------------------
+        fix_hour = datetime.now()  # fix hour set at this specific execution time : after scrub is done
 
-    visible_hours = min(program.SHOW_X_HOURS + 1, len(x))
-    visible_full_hour = start_full_hour + timedelta(hours=visible_hours)
+        times = program.forecast.times()
+        start = times[0]
+        start_full_hour, middle_full_hours = program.full_hours(times)
 
-    mtools = MyMatplotlibTools()
-    register_projection(NoPanXAxes)
+        x = [date2dhour(start_full_hour, t) for t in program.forecast.times()]  # time since start
+        y = program.forecast.delta_altitudes(p_ref=program.P_INITIAL)  # altitude change
+        z = program.forecast.pressures()  # predicted atmospheric pressure
 
-    # one figure
-    fig = plt.figure(
-        # fmt: off
-        dpi=96, figsize=(16, 9),
-        num="{} {}".format(program.STATION_NAME, fix_hour.strftime('%Y%m%d-%H%M')),
-        # fmt: on
-    )
-    plt.figtext(
-        # fmt: off
-        0.95, 0.01,
-        "{} {}".format(program.NAME, program.VERSION),
-        horizontalalignment="right", alpha=0.8, fontsize="x-small",
-        # fmt: on
-    )
+        # ----------------------------------------------------------------------
+        # POLYNOMIAL CURVE FIT
+        # ----------------------------------------------------------------------
 
-    # two subplots on a grid system
-    gs = GridSpec(figure=fig, ncols=1, nrows=2, height_ratios=[3, 1], hspace=0.1, bottom=0.07)
-    topsubplot = fig.add_subplot(
-        gs[0], title="{} ― {}".format(program.STATION_NAME, fix_hour.strftime("%Y.%m.%d %H:%M")),
-    )
-    bottomsubplot = fig.add_subplot(gs[1], sharex=topsubplot, projection="No Pan X Axes")
-
-    # formatting the top (altitude) graph
-    margin = 15
-    topsubplot.set_xlim(start - timedelta(minutes=margin + 5), visible_full_hour + timedelta(minutes=margin + 5))
-    mtools.set_ylimits(topsubplot, y, visible_hours)
-    topsubplot.set_ylabel(_("$\Delta$altitude, $m$"))
-    top_second_x_axis = mtools.format_date_ticks(topsubplot)
-    top_second_y_axis = mtools.format_altitude_tick(topsubplot, shift=program.ELEVATION)
-    top_second_y_axis.set_ylabel(_("altitude, $m$"))
-    mtools.set_grid(topsubplot)
-    loc = "lower right"
-    inset_altitude, rects = mtools.create_inset(topsubplot, bottomsubplot, gs, loc)
-
-    # formatting the bottom (pressure) graph
-    bottomsubplot.set_ylim(260, 1100)  # pressure limits of Casio v3
-
-    scale = (max(z) - min(z)) // 5
-    if scale > 5:
-        base = 20
-    elif scale > 2:
-        base = 10
-    else:
-        base = 5
-
-    bottomsubplot.yaxis.set_major_locator(ticker.MultipleLocator(base=base))
-    bottomsubplot.yaxis.set_minor_locator(ticker.MultipleLocator(base=1))
-    old_ticks = bottomsubplot.get_yticks()
-    bottomsubplot.set_yticks(list(old_ticks) + [1013.25])
-    bottomsubplot.set_yticklabels(list(map(lambda new: "{:.0f} hPa".format(new), old_ticks)) + ["MSL$_{ISA}$"])
-    bottomsubplot.set_ylim(  # multiple of 5, just below the minimum pressure and just above maximum pressure
-        # fmt: off
-        round(2 * (min(z) - 2.5), -1) // 2,
-        round(2 * (max(z) + 2.5), -1) // 2,
-        # fmt: on
-    )
+        if program.VERBOSE:
+            print(program.register_info(_(" POLYNOMIAL CURVE FIT ").center(79, "=")))
+            print()
 
-    mtools.set_grid(bottomsubplot)
-    inset_pressure = mtools.add_inset(topsubplot, bottomsubplot, rects, gs, loc)
+        with METRICS.timer("fit_seconds", "Polynomial curve fit, degree selection included"):
+            curvefit = PolynomialCurveFit(x, y)
+        METRICS.inc("fit_degree_total", "Chosen polynomial degrees", degree=curvefit.degree)
+
+        # verbose dumps: logged at DEBUG level by the program logger, with arguments formatted by the log writer
+        # thread only when the level lets them through (verbose), and echoed on the console
+        verbose_dumps = [
+            Lazy(_("Degree : {}").format, curvefit.degree),
+            Lazy(_("Coefficients : {}").format, curvefit.poly),
+            Lazy(_("Time vector (x) : {}").format, x),
+            Lazy(_("Altitude vector (y) : {}").format, y),
+            Lazy(_("Pressure vector (z) : {}").format, z),
+        ]
+        formula = Lazy(
+            pretty_polyid, polynomial=curvefit.poly, f_text=_("altitude(time)"), var_symbol=_("time"), equal_sign="=",
+        )
+        for dump in verbose_dumps:
+            LOG.debug("%s", dump)
+        LOG.debug("\n%s\n", formula)
 
-    # adding curves/points to subplots
-    topsubplot.errorbar(
-        # fmt: off
-        "time", "altitude", yerr="error", data=curvefit.prediction_dict(ref_hour=start_full_hour),
-        color="green", marker="o", linestyle="none", markersize=5,
-        label=_("Hourly Forecast"),
-        zorder=10,
-        # fmt: on
-    )
+        if program.VERBOSE:
+            for dump in verbose_dumps:
+                print80(str(dump))
+                print()
+            print("\n{}\n".format(formula))
+            print("".center(79, "-"))
+            print()
 
-    topsubplot.plot(
-        # fmt: off
-        "time", "dotted line", data=curvefit.curvefit_dict(start_full_hour, margin=margin),
-        color="red", marker="", linestyle="dotted",
-        label="_nolegend_",
-        zorder=8,
-        # fmt: on
-    )
+        # ----------------------------------------------------------------------
+        # TEXT OUTPUT
+        # ----------------------------------------------------------------------
 
-    topsubplot.step(
-        # fmt: off
-        "time", "steps", data=curvefit.curvefit_dict(start_full_hour, margin=0),
-        where="post",
-        color="red", marker="", linestyle="solid",
-        label=_("Polynomial Regression of degree {}").format(curvefit.degree),
-        zorder=9,
-        # fmt: on
-    )
+        curvefit.compute_steps(ref_hour=start_full_hour, start=start, fix_hour=fix_hour)
 
-    topsubplot.scatter(
-        # fmt: off
-        fix_hour, 0,
-        color="black", marker=9,
-        label=_("Fix at {}").format(no_leading_zeros(fix_hour.strftime('#%H:%M'))),
-        zorder=11,
-        # fmt: on
-    )
+        if program.ARCHIVE_FOLDER:
+            program.archive_run(fix_hour, curvefit, ref_hour=start_full_hour)
 
-    inset_altitude.plot(
-        # fmt: off
-        times, y,
-        color="red", alpha=0.95,
-        picker=lambda hit, evt: (True, {"inset": "altitude"}),
-        # fmt: on
-    )
+        if program.FIX_MATRIX_HOURS:
+            program.save_fix_matrix(fix_hour, curvefit, ref_hour=start_full_hour, start=start)
 
-    bottomsubplot.plot(
-        # fmt: off
-        times, z,
-        color="tab:blue", marker="o", markersize=3.5, linestyle="--",
-        label=_("Atmospheric Pressure"),
-        # fmt: on
-    )
+        program.fill_table(curvefit, times, start_full_hour, middle_full_hours)
 
-    inset_pressure.plot(
-        # fmt: off
-        times, z,
-        color="tab:blue", alpha=0.95,
-        picker=lambda hit, evt: (True, {"inset": "pressure"}),
-        # fmt: on
-    )
+        program.display_results()
 
-    # post-processing subplots
-    topsubplot.legend()
-    bottomsubplot.legend()
+        # from here on, each output is published as soon as its input is ready (see StagedExecutor):
+        # the sinks get the result now, and those needing the image wait for it in their own thread
+        stages = StagedExecutor(localedir=command_line_parser.localedir, lang=_.lang)
+        image_format = program.GRAPH_FILENAME.split(".")[-1].lower()
+        image = Future()
+        sinks = SinkFanOut(program.output_sinks())
+        sinks.publish(
+            RunResult(
+                # fmt: off
+                station=program.STATION_NAME, elevation=program.ELEVATION, fix_hour=fix_hour,
+                table=program.result.display_table(), rows=program.result.rows, steps=curvefit.steps,
+                image_format=image_format, image=image,
+                # fmt: on
+            )
+        )
 
-    zoom_saved = None
+        bands = None
+        if program.BOOTSTRAP_RESAMPLES > 0:
+            bands = curvefit.bootstrap(
+                ref_hour=start_full_hour,
+                start=start,
+                resamples=program.BOOTSTRAP_RESAMPLES,
+                cpu_budget=program.BOOTSTRAP_CPU_BUDGET,
+            )
+            program.display_step_bands(bands)
+
+        # --------------------------------------------------------------------------
+        # GRAPH
+        # --------------------------------------------------------------------------
+
+        visible_hours = min(program.SHOW_X_HOURS + 1, len(x))
+        visible_full_hour = start_full_hour + timedelta(hours=visible_hours)
+
+        graph_run = dict(
+            # fmt: off
+            start=start, visible_full_hour=visible_full_hour, visible_hours=visible_hours,
+            elevation=program.ELEVATION,
+            prediction=curvefit.prediction_dict(ref_hour=start_full_hour),
+            curve=curvefit.curve_arrays(start_full_hour, margin=AltimeterFigure.MARGIN),
+            steps=curvefit.step_vertices(start_full_hour, margin=0),
+            times=times, y=y, z=z,
+            fix_hour=fix_hour,
+            fix_label=_("Fix at {}").format(no_leading_zeros(fix_hour.strftime('#%H:%M'))),
+            fit_label=_("Polynomial Regression of degree {}").format(curvefit.degree),
+            bands=bands,
+            band_label=None if bands is None else _("{:g}% bootstrap band ({} fits)").format(
+                bands["coverage"], bands["resamples"]
+            ),
+            # fmt: on
+        )
+        footer = "{} {}".format(program.NAME, program.VERSION)
+        title = "{} ― {}".format(program.STATION_NAME, fix_hour.strftime("%Y.%m.%d %H:%M"))
+
+        # the saved (and uploaded) graph renders in a worker process, while the window below is built
+        render_start = perf_counter()
+        rendered = stages.render(
+            # fmt: off
+            "render", render_image,
+            footer, title, graph_run, image_format,
+            bbox_inches="tight" if args.slack is not None else None,
+            dpi=program.GRAPH_DPI,
+            orientation=program.GRAPH_ORIENTATION,
+            papertype=program.GRAPH_PAPERTYPE,
+            # fmt: on
+        )
+        stages.forward(rendered, image)
+        rendered.add_done_callback(
+            lambda _done: METRICS.observe(
+                # fmt: off
+                "render_seconds", "Graph rendering in the worker process, start-up included",
+                perf_counter() - render_start,
+                # fmt: on
+            )
+        )
 
-    def toggle_zoom(_):
-        global zoom_saved
-        if zoom_saved is None:
-            zoom_saved = (topsubplot.get_xlim(), topsubplot.get_ylim())
-            topsubplot.autoscale(True)
-            fig.canvas.draw_idle()
-        else:
-            topsubplot.autoscale(False)
-            topsubplot.set_xlim(zoom_saved[0])
-            topsubplot.set_ylim(zoom_saved[1])
-            fig.canvas.draw_idle()
-            zoom_saved = None
+        if not args.no_key:
+            figure = AltimeterFigure(footer=footer)
+            figure.set_title(title, window_title="{} {}".format(program.STATION_NAME, fix_hour.strftime("%Y%m%d-%H%M")))
+            figure.render(**graph_run)
+            fig, topsubplot, rects, readout = figure.fig, figure.top, figure.rects, figure.readout
+            plt.rcParams["savefig.directory"] = None  # To force output in default directories
 
-    def hover(event):
-        inset_altitude.set_label("hover")
-        fig.canvas.draw_idle()
+            # interactive session: only the inset rectangles and the readout are redrawn on hover/zoom/pan
+            blit = BlitManager(fig.canvas, [rects.r[0], rects.r[1], readout.text])
+            rects.blit = blit
+            readout.blit = blit
 
-    fig.canvas.mpl_connect("pick_event", toggle_zoom)
-    fig.canvas.mpl_connect("motion_notify_event", hover)
+            zoom_saved = None
 
-    plt.rcParams["savefig.directory"] = None  # To force output in default directories
-    plt.savefig(  # save first because plt.show() clears the plot
-        program.GRAPH_FILENAME,
-        bbox_inches="tight" if args.slack is not None else None,
-        dpi=program.GRAPH_DPI,
-        orientation=program.GRAPH_ORIENTATION,
-        papertype=program.GRAPH_PAPERTYPE,
-    )
+            def toggle_zoom(_):
+                global zoom_saved
+                if zoom_saved is None:
+                    zoom_saved = (topsubplot.get_xlim(), topsubplot.get_ylim())
+                    topsubplot.autoscale(True)
+                else:
+                    topsubplot.autoscale(False)
+                    topsubplot.set_xlim(zoom_saved[0])
+                    topsubplot.set_ylim(zoom_saved[1])
+                    zoom_saved = None
+                blit.full_redraw()
+
+            fig.canvas.mpl_connect("pick_event", toggle_zoom)
+            fig.canvas.mpl_connect("motion_notify_event", readout.hover)
+
+            mng = plt.get_current_fig_manager()
+            mng.window.state("zoomed")
+            plt.show()
+
+        sinks.close()
+        stages.shutdown()
+        if program.VERBOSE:
+            for stage, elapsed in {**sinks.timings, **stages.timings}.items():
+                print80(program.register_info(_("{} done {:.0f} ms after the text table").format(stage, elapsed)))
 
-    if args.slack is not None:
-        program.send_to_slack(fix_hour)
-
-    if not args.no_key:
-        mng = plt.get_current_fig_manager()
-        mng.window.state("zoomed")
-        plt.show()
-
-# ----------------------------------------------------------------------
-# CLEAN UP
-# ----------------------------------------------------------------------
-except Exception as e:
-    logging.error(traceback.format_exc())
-    traceback.print_exc()
-    if not args.no_key:
-        system("pause")
-else:
-    if program.PAUSE:
-        system("pause")
-finally:
-    if program.browser.driver.service.process is not None:
-        program.browser.quit()
+    # ----------------------------------------------------------------------
+    # CLEAN UP
+    # ----------------------------------------------------------------------
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        traceback.print_exc()
+        if not args.no_key:
+            system("pause")
+    else:
+        if program.PAUSE:
+            system("pause")
+    finally:
+        if program.browser.driver is not None and program.browser.driver.service.process is not None:
+            program.browser.quit()
+        if metrics_dumper is not None:
+            metrics_dumper.stop()
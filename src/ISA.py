@@ -23,6 +23,8 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import numpy as np
+
 
 class AtmosphericPressure:
     """
@@ -31,14 +33,28 @@ class AtmosphericPressure:
 
     __slots__ = ["value"]
 
+    MINIMUM = 260  # hPa
+    MAXIMUM = 1100  # hPa
+    OUT_OF_RANGE = "Pressure out of range (260 hPa < pressure < 1100 hPa)"
+
     def __init__(self, hectopascal: float):
         """
         :param hectopascal: 260 hPa < pressure < 1100 hPa
         """
-        if 260 < hectopascal < 1100:
+        if self.MINIMUM < hectopascal < self.MAXIMUM:
             self.value = hectopascal
         else:
-            raise ValueError("Pressure out of range (260 hPa < pressure < 1100 hPa)")
+            raise ValueError(self.OUT_OF_RANGE)
+
+    @classmethod
+    def validate_many(cls, hectopascals):
+        """
+        Same check as the constructor, done once for a whole array and without creating any object
+
+        :param hectopascals: numpy array of pressures in hPa
+        """
+        if not ((cls.MINIMUM < hectopascals) & (hectopascals < cls.MAXIMUM)).all():
+            raise ValueError(cls.OUT_OF_RANGE)
 
     def __call__(self, *args, **kwargs) -> float:
         """
@@ -67,13 +83,17 @@ class InternationalStandardAtmosphere:
 
     def pressure(self, altitude: float) -> float:
         """
-        :param altitude: altitude in meters
+        :param altitude: altitude in meters, or numpy array of altitudes
         :return: pressure (in hPa) found at this altitude
 
         Pressure found at an altitude above Mean Sea Level
         according to the International Standard Atmosphere (ISA) model
         """
-        if -700 < altitude < 10000:
+        if isinstance(altitude, np.ndarray):
+            in_range = ((-700 < altitude) & (altitude < 10000)).all()
+        else:
+            in_range = -700 < altitude < 10000
+        if in_range:
             # fmt: off
             return self.PRESSURE_MSL * (1 - (altitude / (self.TEMP_MSL / self.TEMP_GRADIANT))) ** self.PERFECT_GAS
             # fmt: on
@@ -82,13 +102,17 @@ class InternationalStandardAtmosphere:
 
     def altitude(self, pressure: AtmosphericPressure) -> float:
         """
-        :param pressure: pressure in hPa
+        :param pressure: pressure in hPa, or numpy array of pressures
         :return: altitude (in meters) corresponding to this pressure
 
         Altitude above Mean Sea Level whilst experiencing this pressure
         according to the International Standard Atmosphere (ISA) model
         """
-        p = AtmosphericPressure(pressure).value
+        if isinstance(pressure, np.ndarray):
+            AtmosphericPressure.validate_many(pressure)
+            p = pressure
+        else:
+            p = AtmosphericPressure(pressure).value
         # fmt: off
         return (self.TEMP_MSL / self.TEMP_GRADIANT) * (1 - (p / self.PRESSURE_MSL) ** (1 / self.PERFECT_GAS))
         # fmt: on
@@ -96,8 +120,8 @@ class InternationalStandardAtmosphere:
     def delta_altitude(self, p_ref: float, current_p: float = None, delta_p: float = None) -> float:
         """
         :param p_ref: reference pressure in hPa
-        :param current_p: current pressure in hPa
-        :param delta_p: how much (in hPa) the pressure departed from the reference pressure
+        :param current_p: current pressure in hPa, or numpy array of pressures
+        :param delta_p: how much (in hPa) the pressure departed from the reference pressure, or numpy array
         :return: equivalent climb/descent in meters
 
         How much meters one climbed or descended when starting at a reference pressure
@@ -113,7 +137,7 @@ class InternationalStandardAtmosphere:
             _dp = p_ref - current_p
             _cp = current_p
 
-        if current_p is not None and delta_p is not None and _dp != delta_p:
+        if current_p is not None and delta_p is not None and np.any(_dp != delta_p):
             raise ValueError("Current pressure contradicted by pressure variation")
 
         if delta_p is not None:
@@ -168,3 +192,26 @@ if __name__ == "__main__":
             average = (plus - minus) / 2
             print(f"{average:5.2f}", end=" ")
         print()
+
+    # Million-point conversions, as in backtest.py: one call per point against one call per array
+    from time import perf_counter
+
+    rng = np.random.default_rng(0)
+    pressures = rng.uniform(AtmosphericPressure.MINIMUM + 1e-9, AtmosphericPressure.MAXIMUM - 1e-9, 1_000_000)
+    altitudes = rng.uniform(-700 + 1e-9, 10000 - 1e-9, 1_000_000)
+
+    start = perf_counter()
+    per_point = [isa.delta_altitude(p_ref=1013.25, current_p=p) for p in pressures.tolist()]
+    loop = perf_counter() - start
+    start = perf_counter()
+    per_array = isa.delta_altitude(p_ref=1013.25, current_p=pressures)
+    vectorized = perf_counter() - start
+    print()
+    print(f"1,000,000 delta_altitude: {loop * 1000:.0f} ms one point at a time, {vectorized * 1000:.1f} ms in one call")
+
+    # Both paths evaluate the same formulas: the array results must match the scalar ones to float rounding
+    altitude_error = np.max(np.abs(per_array - np.array(per_point)))
+    sample = altitudes[:100_000]
+    pressure_error = max(abs(isa.pressure(altitude=a) - b) for a, b in zip(sample.tolist(), isa.pressure(sample)))
+    print(f"largest difference with the scalar formulas: {altitude_error:.1e} m, {pressure_error:.1e} hPa")
+    assert altitude_error < 1e-6 and pressure_error < 1e-9
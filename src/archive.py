@@ -0,0 +1,246 @@
+#! python3
+"""
+MIT License
+
+Copyright (c) 2020 Walter Wlodarski
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from shutil import rmtree
+
+import numpy as np
+
+from configstore import FileLock
+from utils import output_path
+
+MAX_COEFFICIENTS = 16  # polynomial coefficients kept per run, NaN padded on the left (highest powers)
+
+# table -> [(column, dtype, shape of one row)]
+SCHEMA = {
+    "points": [("run", "datetime64[s]", ()), ("time", "datetime64[s]", ()), ("pressure", "float32", ())],
+    "runs": [
+        ("run", "datetime64[s]", ()),
+        ("ref_hour", "datetime64[s]", ()),
+        ("p_initial", "float32", ()),
+        ("elevation", "int16", ()),
+        ("degree", "int8", ()),
+        ("coefficients", "float64", (MAX_COEFFICIENTS,)),
+    ],
+    "steps": [("run", "datetime64[s]", ()), ("time", "datetime64[s]", ()), ("step", "int16", ())],
+}
+TIME_COLUMN = {"points": "time", "runs": "run", "steps": "time"}
+SEALED = "sealed"  # sealed.<generation>/<table>.<column>.npy
+
+
+def _month(dt) -> str:
+    return str(np.datetime64(dt, "M"))
+
+
+def _row_size(dtype, shape) -> int:
+    return np.dtype(dtype).itemsize * int(np.prod(shape, dtype=int))
+
+
+def _raw_files(folder: Path) -> list:
+    return [folder / f"{table}.{column}" for table, columns in SCHEMA.items() for column, _dtype, _shape in columns]
+
+
+def _sealed_folders(folder: Path) -> list:
+    """ Every generation of sealed files of a month, the latest last """
+    return sorted(folder.glob(SEALED + ".[0-9]*"), key=lambda path: int(path.suffix[1:]))
+
+
+def _within(times: np.ndarray, start: np.datetime64, end: np.datetime64, is_sorted: bool):
+    """ Rows of times within [start, end]: a slice when times are sorted, so memory maps are not read """
+    if is_sorted:
+        return slice(np.searchsorted(times, start, side="left"), np.searchsorted(times, end, side="right"))
+    return (times >= start) & (times <= end)
+
+
+class ForecastArchive:
+    """
+    | Append-only archive of every run: forecast points, fit results and step changes.
+    |
+    | <root>/<station>/<YYYY-MM>/ holds one raw binary file per column and table, appended to at every run
+    | and memory-mapped by queries. Months that are over are sealed into one .npy file per column, sorted by time,
+    | so that queries memory-map them too and only read the rows within their time window.
+    """
+
+    __slots__ = ["root"]
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def partition(self, station: str, run: datetime) -> Path:
+        return self.root / output_path("{station}", station=station) / _month(run)
+
+    def stations(self) -> list:
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir()) if self.root.is_dir() else []
+
+    def append(self, station: str, run: datetime, forecast, curvefit, ref_hour: datetime, p_initial, elevation):
+        """
+        :param station: weather station name
+        :param run: fix time of this run
+        :param forecast: Forecast
+        :param curvefit: PolynomialCurveFit, after compute_steps()
+        :param ref_hour: reference datetime from which decimal hour = 0.0
+        :param p_initial: current pressure at the station, in hPa
+        :param elevation: station elevation in meters
+        """
+        _run = np.datetime64(run, "s")
+        coefficients = np.full(MAX_COEFFICIENTS, np.nan)
+        poly = np.asarray(curvefit.poly)[-MAX_COEFFICIENTS:]
+        coefficients[MAX_COEFFICIENTS - len(poly) :] = poly
+
+        step_times, steps = curvefit.steps if curvefit.steps is not None else ([], [])
+        numeric = [(t, s) for t, s in zip(step_times, steps) if isinstance(s, (int, np.integer))]  # without [fix]
+
+        rows = {
+            "points": {
+                "run": np.full(len(forecast), _run),
+                "time": forecast.time_array(),
+                "pressure": forecast.pressure_array(),
+            },
+            "runs": {
+                "run": [_run],
+                "ref_hour": [np.datetime64(ref_hour, "s")],
+                "p_initial": [p_initial],
+                "elevation": [elevation],
+                "degree": [curvefit.degree],
+                "coefficients": [coefficients],
+            },
+            "steps": {
+                "run": np.full(len(numeric), _run),
+                "time": [np.datetime64(t, "s") for t, _s in numeric],
+                "step": [s for _t, s in numeric],
+            },
+        }
+
+        folder = self.partition(station, run)
+        folder.mkdir(parents=True, exist_ok=True)
+        with FileLock(folder / "append"):
+            for table, columns in SCHEMA.items():
+                self._truncate_to_complete_rows(folder, table)
+                for column, dtype, shape in columns:
+                    values = np.asarray(rows[table][column], dtype=dtype).reshape((-1,) + shape)
+                    with open(folder / f"{table}.{column}", "ab") as raw:
+                        raw.write(values.tobytes())
+
+        self.seal(station, before=run)
+
+    @staticmethod
+    def _truncate_to_complete_rows(folder: Path, table: str) -> None:
+        """
+        An interrupted append may leave some columns of a table longer than others, or end with a partial row.
+        Cuts every column back to the rows all of them hold, so the next append lines up again. Lock held.
+        """
+        paths = [(folder / f"{table}.{column}", _row_size(dtype, shape)) for column, dtype, shape in SCHEMA[table]]
+        sizes = [path.stat().st_size if path.exists() else 0 for path, _size in paths]
+        complete = min(size // row_size for size, (_path, row_size) in zip(sizes, paths))
+        for size, (path, row_size) in zip(sizes, paths):
+            if size != complete * row_size:
+                with open(path, "r+b") as raw:
+                    raw.truncate(complete * row_size)
+
+    @staticmethod
+    def _read_raw(folder: Path, table: str) -> dict:
+        columns = {}
+        for column, dtype, shape in SCHEMA[table]:
+            path = folder / f"{table}.{column}"
+            row_size = _row_size(dtype, shape)
+            rows = path.stat().st_size // row_size if path.exists() else 0
+            columns[column] = (
+                np.memmap(path, dtype=dtype, mode="r", shape=(rows,) + shape)
+                if rows
+                else np.empty((0,) + shape, dtype=dtype)
+            )
+        # an append in progress, or an interrupted one not repaired yet, may leave some columns longer than others
+        complete = min(len(c) for c in columns.values())
+        return {column: values[:complete] for column, values in columns.items()}
+
+    @staticmethod
+    def _read_sealed(folder: Path, table: str) -> dict:
+        """ Columns of the latest sealed generation, memory-mapped and sorted by time, or None """
+        generations = _sealed_folders(folder)
+        if not generations:
+            return None
+        return {c: np.load(generations[-1] / f"{table}.{c}.npy", mmap_mode="r") for c, _dtype, _shape in SCHEMA[table]}
+
+    def _parts(self, folder: Path, table: str) -> list:
+        """ [(columns, sorted by time)] of one month: sealed rows, if any, then raw rows """
+        sealed = self._read_sealed(folder, table)
+        return ([] if sealed is None else [(sealed, True)]) + [(self._read_raw(folder, table), False)]
+
+    def seal(self, station: str, before: datetime) -> None:
+        """
+        | Seals the raw files of every month of station that ended before 'before' : one .npy file per column,
+        | sorted by time, merged with what was sealed before (late appends), in a new generation folder
+        | that appears complete (rename)
+        """
+        station_folder = self.root / output_path("{station}", station=station)
+        for folder in sorted(station_folder.iterdir()):
+            if folder.name >= _month(before) or not any(f.exists() for f in _raw_files(folder)):
+                continue
+            with FileLock(folder / "append"):
+                previous = _sealed_folders(folder)
+                generation = int(previous[-1].suffix[1:]) + 1 if previous else 1
+                sealing = folder / "sealing"
+                sealing.mkdir(exist_ok=True)
+                for table in SCHEMA:
+                    parts = [columns for columns, _sorted in self._parts(folder, table)]
+                    times = np.concatenate([p[TIME_COLUMN[table]] for p in parts])
+                    order = np.argsort(times, kind="stable")
+                    del times
+                    for column, _dtype, _shape in SCHEMA[table]:
+                        np.save(sealing / f"{table}.{column}.npy", np.concatenate([p[column] for p in parts])[order])
+                    del parts  # no memory map may remain open on the files removed below (Windows)
+                sealing.replace(folder / f"{SEALED}.{generation}")
+                for raw in _raw_files(folder):
+                    raw.unlink(missing_ok=True)
+                for old in previous:
+                    rmtree(old, ignore_errors=True)  # still mapped by a query (Windows): left
+
+    def query(self, station: str, start: datetime, end: datetime, table: str = "points") -> dict:
+        """
+        All rows of one table whose time is within [start, end]
+
+        :param station: weather station name
+        :param start: datetime
+        :param end: datetime
+        :param table: 'points', 'runs' or 'steps'
+        :return: {column: numpy array}
+        """
+        first = np.datetime64(start, "M") - 1  # forecasts made late in a month reach into the next one
+        last = np.datetime64(end, "M")
+        station_folder = self.root / output_path("{station}", station=station)
+        folders = [f for f in sorted(station_folder.glob("????-??")) if first <= np.datetime64(f.name, "M") <= last]
+
+        # the time window is applied to each memory-mapped part, so only the rows within it are ever copied
+        _start, _end = np.datetime64(start, "s"), np.datetime64(end, "s")
+        selected = []
+        for folder in folders:
+            for columns, is_sorted in self._parts(folder, table):
+                rows = _within(columns[TIME_COLUMN[table]], _start, _end, is_sorted)
+                selected.append({c: v[rows] for c, v in columns.items()})
+        return {
+            c: np.concatenate([s[c] for s in selected]) if selected else np.empty((0,) + shape, dtype=dtype)
+            for c, dtype, shape in SCHEMA[table]
+        }
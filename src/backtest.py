@@ -0,0 +1,230 @@
+#! python3
+"""
+MIT License
+
+Copyright (c) 2020 Walter Wlodarski
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import argparse
+import builtins
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from numpy import polyfit, polyval
+
+from ISA import InternationalStandardAtmosphere
+from archive import ForecastArchive
+from curvefit import PolynomialCurveFit
+from ingest import read_runs
+
+MAX_LEAD_HOURS = 24
+MAX_GAP = 3  # hours; observed pressures further apart than this are not interpolated
+
+
+def _linear(x, y):
+    return lambda t: np.interp(t, x, y)
+
+
+def _fixed_degree(degree):
+    def strategy(x, y):
+        poly = polyfit(x, y, min(degree, len(x) - 1))
+        return lambda t: polyval(poly, t)
+
+    return strategy
+
+
+def _leave_one_out(x, y):
+    poly = PolynomialCurveFit(list(x), list(y)).poly
+    return lambda t: polyval(poly, t)
+
+
+# name -> function(x, y) returning the predicted altitude at decimal hour(s) t
+STRATEGIES = {
+    "LOO degree": _leave_one_out,
+    "degree 1": _fixed_degree(1),
+    "degree 2": _fixed_degree(2),
+    "degree 3": _fixed_degree(3),
+    "linear interp.": _linear,
+    "persistence": lambda x, y: (lambda t: np.zeros_like(np.asarray(t, dtype=float))),
+}
+
+
+def _quiet_worker():
+    builtins.__dict__.setdefault("_", lambda message: message)  # curvefit warnings are translated
+    warnings.simplefilter("ignore")
+
+
+def evaluate_run(task) -> dict:
+    """
+    Prediction error of every strategy for one archived run, at every lead hour with an observed pressure
+
+    :param task: (run, times of the forecast points, their pressures, observation times, observed pressures, max gap)
+    :return: {strategy: [(lead hour, predicted - observed altitude change)]}
+    """
+    run, times, pressures, obs_times, obs_pressures, max_gap = task
+    isa = InternationalStandardAtmosphere()
+    obs_x = (obs_times - run) / np.timedelta64(1, "h")
+    p_fix = float(np.interp(0.0, obs_x, obs_pressures))  # observed at the fix, as P_INITIAL
+
+    x = (times - run) / np.timedelta64(1, "h")
+    y = isa.delta_altitude(p_ref=p_fix, current_p=pressures)
+
+    leads = np.arange(1, min(MAX_LEAD_HOURS, int(x[-1])) + 1, dtype=float)
+    gaps = np.diff(obs_x)
+    position = np.searchsorted(obs_x, leads)
+    observed = (position > 0) & (position < len(obs_x))
+    observed[observed] &= gaps[position[observed] - 1] <= max_gap
+    leads = leads[observed]
+    actual = isa.delta_altitude(p_ref=p_fix, current_p=np.interp(leads, obs_x, obs_pressures))
+
+    errors = {}
+    for name, strategy in STRATEGIES.items():
+        predict = strategy(x, y)
+        predicted = np.asarray(predict(leads)) - predict(0.0)  # change since the fix
+        errors[name] = list(zip(leads.tolist(), (predicted - actual).tolist()))
+    return errors
+
+
+def _tasks(points: dict, runs: dict, max_gap: float) -> list:
+    """
+    :param points: forecast points of one station, {'run': [], 'time': [], 'pressure': []} as in ForecastArchive
+    :param runs: runs of that station, {'run': [], 'p_initial': []}
+    :return: evaluate_run() tasks
+    """
+    order = np.argsort(runs["run"], kind="stable")
+    obs_times, obs_pressures = runs["run"][order], runs["p_initial"][order].astype(float)
+
+    _tasks = []
+    for run in obs_times:
+        mine = points["run"] == run
+        times, pressures = points["time"][mine], points["pressure"][mine].astype(float)
+        if len(times) > 3 and run + np.timedelta64(1, "h") <= obs_times[-1]:  # something to compare with
+            _order = np.argsort(times, kind="stable")
+            _tasks.append((run, times[_order], pressures[_order], obs_times, obs_pressures, max_gap))
+    return _tasks
+
+
+def tasks(archive: ForecastArchive, station: str, start: datetime, end: datetime, max_gap: float = MAX_GAP) -> list:
+    return _tasks(archive.query(station, start, end, "points"), archive.query(station, start, end, "runs"), max_gap)
+
+
+def file_tasks(source: str, stations: list, start: datetime, end: datetime, max_gap: float = MAX_GAP) -> list:
+    """
+    Same as tasks(), for the runs of a CSV or JSON lines file (see ingest.read_runs), all stations at once
+    """
+    columns = {}  # station -> ({column: [arrays]} of the points, {column: [values]} of the runs)
+    for run in read_runs(source):
+        if (stations and run.station not in stations) or not start <= run.run <= end or run.p_initial is None:
+            continue
+        points, runs = columns.setdefault(
+            run.station, ({"run": [], "time": [], "pressure": []}, {"run": [], "p_initial": []})
+        )
+        _run = np.datetime64(run.run, "s")
+        points["run"].append(np.full(len(run.forecast), _run))
+        points["time"].append(run.forecast.time_array().astype("datetime64[s]"))
+        points["pressure"].append(run.forecast.pressure_array())
+        runs["run"].append(_run)
+        runs["p_initial"].append(run.p_initial)
+
+    _all = []
+    for points, runs in columns.values():
+        _points = {c: np.concatenate(arrays) for c, arrays in points.items()}
+        _all += _tasks(_points, {c: np.array(values) for c, values in runs.items()}, max_gap)
+    return _all
+
+
+def backtest(source: str, stations: list, start: datetime, end: datetime, workers=None, max_gap=MAX_GAP):
+    """
+    Replays every archived run of the stations, spread over a pool of processes
+
+    :param source: archive folder (see ForecastArchive), or CSV or JSON lines file, or - (see ingest.read_runs)
+    :param stations: station names, or None for all of them
+    :param start: first run
+    :param end: last run
+    :param workers: number of processes, all cores by default
+    :param max_gap: hours between two observations beyond which no observed pressure is interpolated
+    :return: {strategy: {lead hour: [errors in meters]}}
+    """
+    if source != "-" and Path(source).is_dir():
+        archive = ForecastArchive(source)
+        stations = stations or archive.stations()
+        all_tasks = [t for station in stations for t in tasks(archive, station, start, end, max_gap)]
+    else:
+        all_tasks = file_tasks(source, stations, start, end, max_gap)
+
+    results = {name: {} for name in STRATEGIES}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_quiet_worker) as pool:
+        for errors in pool.map(evaluate_run, all_tasks, chunksize=max(1, len(all_tasks) // 64)):
+            for name, pairs in errors.items():
+                for lead, error in pairs:
+                    results[name].setdefault(int(lead), []).append(error)
+    return results
+
+
+def summary_table(results: dict) -> str:
+    names = list(results)
+    leads = sorted({lead for by_lead in results.values() for lead in by_lead})
+    lines = ["lead (h)  runs " + "".join(f"{name:>16}" for name in names), "=" * (15 + 16 * len(names))]
+    for lead in leads:
+        count = len(results[names[0]].get(lead, []))
+        cells = "".join(f"{np.mean(np.abs(results[n][lead])):>14.2f} m" for n in names)
+        lines.append(f"{lead:8d} {count:5d}" + cells)
+    return "\n".join(lines)
+
+
+def summary_plot(results: dict, filename: str) -> None:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    for name, by_lead in results.items():
+        leads = sorted(by_lead)
+        ax.plot(leads, [np.mean(np.abs(by_lead[lead])) for lead in leads], marker="o", markersize=3, label=name)
+    ax.set_xlabel("lead time, h")
+    ax.set_ylabel("mean absolute altitude error, m")
+    ax.grid(True, linewidth=0.5, color="0.75")
+    ax.legend()
+    fig.savefig(filename, bbox_inches="tight", dpi=150)
+
+
+if __name__ == "__main__":
+    _quiet_worker()
+    parser = argparse.ArgumentParser(description="Replays past forecasts against the pressures observed later")
+    parser.add_argument(
+        "source", help="archive folder (see 'archive folder' in config.ini), CSV or JSON lines file, or - for stdin"
+    )
+    parser.add_argument("--station", action="append", help="station name, repeatable (default: all)")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=datetime(1970, 1, 1))
+    parser.add_argument("--end", type=datetime.fromisoformat, default=datetime(2100, 1, 1))
+    parser.add_argument("--workers", type=int, help="processes (default: all cores)")
+    parser.add_argument("--max-gap", type=float, default=MAX_GAP, help="hours between observations to interpolate")
+    parser.add_argument("--plot", default="backtest.png", help="output graph filename")
+    args = parser.parse_args()
+
+    backtest_results = backtest(args.source, args.station, args.start, args.end, args.workers, args.max_gap)
+    print(summary_table(backtest_results))
+    summary_plot(backtest_results, args.plot)
+    print(f"\n{args.plot}")
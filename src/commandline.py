@@ -49,6 +49,18 @@ class CommandLineParser:  # TODO: not sure it needs to be a class
         self.all_lang = [d.name for d in self.localedir.iterdir() if d.is_dir()]
 
         self.parser.add_argument("--lang", help="interface language ({})".format(", ".join(self.all_lang)))
+        self.parser.add_argument(
+            "-o",
+            "--output",
+            choices=["table", "json", "csv"],
+            default="table",
+            help="format of the results on stdout (json and csv stream one row at a time)",
+        )
+        self.parser.add_argument(
+            "--from-file",
+            metavar="FILE",
+            help="read the forecasts from a CSV or JSON lines file, an archive folder or - (stdin) instead of the web",
+        )
         self.parser.add_argument(
             "-v", "--verbose", action="store_true", help="include details about the polynomial model",
         )
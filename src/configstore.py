@@ -0,0 +1,193 @@
+#! python3
+"""
+MIT License
+
+Copyright (c) 2020 Walter Wlodarski
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import stat
+from configparser import ConfigParser
+from pathlib import Path
+from hashlib import sha1
+from tempfile import NamedTemporaryFile, gettempdir
+
+try:  # advisory locks differ between Windows and POSIX
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+from metrics import METRICS
+
+# lock files of FileLock, one folder per user where the temporary folder is shared (POSIX)
+LOCK_FOLDER = Path(gettempdir()) / "DR-Altimeter-locks"
+if hasattr(os, "getuid"):
+    LOCK_FOLDER = LOCK_FOLDER.with_name("{}-{}".format(LOCK_FOLDER.name, os.getuid()))
+
+_parsed = {}  # path -> (mtime, {section: {option: value}}), shared by every store of this process
+
+
+def _file_mode(path: Path) -> int:
+    """
+    Permissions of path, or those a new file gets from the umask
+    """
+    if path.exists():
+        return stat.S_IMODE(path.stat().st_mode)
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+class FileLock:
+    """
+    | Advisory lock on path, ex) held while the configuration file is merged and replaced
+    |
+    | The lock file is LOCK_FOLDER/<name>-<hash>.lock, not left next to path. The hash is that of the absolute path,
+    | so that every instance locking the same path shares the same lock file.
+    """
+
+    __slots__ = ["path", "file"]
+
+    def __init__(self, path: Path):
+        _absolute = str(Path(path).resolve())
+        self.path = LOCK_FOLDER / "{}-{}.lock".format(Path(path).name, sha1(_absolute.encode("utf-8")).hexdigest()[:16])
+        self.file = None
+
+    def __enter__(self):
+        LOCK_FOLDER.mkdir(exist_ok=True)
+        self.file = open(self.path, "a+")
+        if msvcrt is not None:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)  # retries for about 10 seconds
+        else:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *_):
+        if msvcrt is not None:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
+
+
+class ConfigStore:
+    """
+    | ConfigParser that remembers which options changed and writes only those, and only when there are any.
+    |
+    | Writes are atomic (temporary file + rename) and made under an advisory lock, after merging with
+    | the file as it is on disk, so that simultaneous instances never lose each other's values.
+    | Parsed files are cached by modification time: reloading an unchanged file costs no parsing.
+    """
+
+    __slots__ = ["path", "parser", "changed"]
+
+    def __init__(self, filename: str):
+        self.path = Path(filename)
+        self.parser = ConfigParser()
+        self.parser.read_dict(self._load(self.path))
+        self.changed = {}  # (section, option) -> value, or section -> None for a new section
+
+    @staticmethod
+    def _load(path: Path) -> dict:
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        cached = _parsed.get(path.resolve())
+        if cached is not None and cached[0] == mtime:
+            METRICS.inc("cache_lookups_total", "Cache lookups", cache="config", result="hit")
+            return cached[1]
+        METRICS.inc("cache_lookups_total", "Cache lookups", cache="config", result="miss")
+        parser = ConfigParser()
+        parser.read(path)
+        content = {section: dict(parser.items(section, raw=True)) for section in parser.sections()}
+        _parsed[path.resolve()] = (mtime, content)
+        return content
+
+    def sections(self) -> list:
+        return self.parser.sections()
+
+    def add_section(self, section: str) -> None:
+        self.parser.add_section(section)
+        self.changed[section] = None
+
+    def has_option(self, section: str, option: str) -> bool:
+        return self.parser.has_option(section, option)
+
+    def get(self, section: str, option: str, fallback: str = None) -> str:
+        return self.parser.get(section, option, fallback=fallback)
+
+    def set(self, section: str, option: str, value: str) -> None:
+        if not self.parser.has_option(section, option) or self.parser.get(section, option, raw=True) != value:
+            self.parser.set(section, option, value)
+            self.changed[(section, option)] = value
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.changed)
+
+    def save(self) -> bool:
+        """
+        Writes the changed options, if any
+
+        :return: True if the file was written
+        """
+        if not self.changed:
+            return False
+
+        with FileLock(self.path):
+            on_disk = ConfigParser()
+            on_disk.read(self.path)
+            for key, value in self.changed.items():
+                if value is None:
+                    if not on_disk.has_section(key):
+                        on_disk.add_section(key)
+                else:
+                    section, option = key
+                    if not on_disk.has_section(section):
+                        on_disk.add_section(section)
+                    on_disk.set(section, option, value)
+
+            folder = self.path.resolve().parent
+            with NamedTemporaryFile("w", dir=folder, prefix=self.path.name + ".", suffix=".tmp", delete=False) as tmp:
+                try:
+                    on_disk.write(tmp)
+                except BaseException:
+                    tmp.close()
+                    os.unlink(tmp.name)
+                    raise
+            try:
+                os.chmod(tmp.name, _file_mode(self.path))  # temporary files are created private (0600)
+                os.replace(tmp.name, self.path)
+            except BaseException:
+                os.unlink(tmp.name)
+                raise
+
+            content = {section: dict(on_disk.items(section, raw=True)) for section in on_disk.sections()}
+            _parsed[self.path.resolve()] = (self.path.stat().st_mtime_ns, content)
+
+        self.parser = ConfigParser()
+        self.parser.read_dict(content)
+        self.changed = {}
+        return True
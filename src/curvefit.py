@@ -25,6 +25,7 @@ SOFTWARE.
 
 import warnings
 from datetime import datetime, timedelta
+from time import process_time
 
 import numpy as np
 from numpy import polyval, polyfit
@@ -52,6 +53,10 @@ def date2dhour(date_ref: datetime, date: datetime) -> float:
     return (date - date_ref).total_seconds() / 3600
 
 
+BOOTSTRAP_CHUNK = 50  # resampled series solved together, between two checks of the CPU budget
+STEP_SEARCH_HOURS = 3  # a resampled step change further away than this is considered missing
+
+
 class PolynomialCurveFit:
     __slots__ = ["x", "y", "degree", "poly", "error", "steps"]
 
@@ -63,6 +68,26 @@ class PolynomialCurveFit:
         self.error = self.error_matrix()
         self.steps = None
 
+    @classmethod
+    def from_solution(cls, x_vector, y_vector, degree: int, poly):
+        """
+        Curve fit whose degree and coefficients are already known, ex) found by fit_stations()
+
+        :param x_vector: decimal hours
+        :param y_vector: altitudes
+        :param degree: polynomial degree
+        :param poly: polynomial coefficients, highest power first (as numpy.polyfit)
+        :return: PolynomialCurveFit
+        """
+        fit = cls.__new__(cls)
+        fit.x = x_vector
+        fit.y = y_vector
+        fit.degree = degree
+        fit.poly = poly
+        fit.error = fit.error_matrix()
+        fit.steps = None
+        return fit
+
     def best_degree(self) -> int:
         """
         Finds the polynomial degree with the best fit by removing one point of data
@@ -168,6 +193,41 @@ class PolynomialCurveFit:
         c_fit["steps"] = list(map(self._int_round, c_fit["dotted line"]))
         return c_fit
 
+    def curve_arrays(self, ref_hour, margin=None):
+        """
+        Same minute grid as curvefit_dict(), as numpy arrays, for plotting
+
+        |:return:  {'time': datetime64[us] array,
+        |           'dotted line': altitude array}
+        """
+        first = self.x[0]
+        last = self.x[-1]
+        one_minute = 1 / 60
+        if margin is None:
+            grid = np.arange(0, last, one_minute)
+        else:
+            grid = np.arange(first - margin * one_minute, last + margin * one_minute, one_minute)
+
+        return {
+            "time": np.datetime64(ref_hour, "us") + np.rint(grid * 3600e6).astype("timedelta64[us]"),
+            "dotted line": polyval(self.poly, grid),
+        }
+
+    def step_vertices(self, ref_hour, margin=None):
+        """
+        Only the vertices where the rounded altitude changes (the change points of compute_steps()),
+        plus both ends. Drawn with where="post", it is the same step line as curvefit_dict()["steps"]
+
+        |:return:  {'time': datetime64[us] array,
+        |           'steps': int array}
+        """
+        curve = self.curve_arrays(ref_hour, margin=margin)
+        steps = np.rint(curve["dotted line"]).astype(int)
+        if len(steps) == 0:
+            return {"time": curve["time"], "steps": steps}
+        keep = np.concatenate(([0], np.flatnonzero(np.diff(steps)) + 1, [len(steps) - 1]))
+        return {"time": curve["time"][keep], "steps": steps[keep]}
+
     def step_changes(self, ref_hour, fix_hour=None):  # TODO remove when done refactoring
         times = []
         steps = []
@@ -209,10 +269,274 @@ class PolynomialCurveFit:
         self.steps = times, steps
 
     def step_text(self, hr):
-        from utils import filter_by_hour, cross_platform_leading_zeros_removal as nz
+        from utils import share_same_hour, cross_platform_leading_zeros_removal as nz
 
         times, steps = self.steps
-        in_hour = filter_by_hour(times, hr=hr)
-        index = [times.index(t) for t in in_hour]
+        index = [i for i, t in enumerate(times) if share_same_hour(t, hr)]  # a step and the fix may share a minute
         texts = [f"{nz(times[i].strftime('#%Hh%M'))}[{steps[i]}]" for i in index]
         return ", ".join(texts)
+
+    def bootstrap(self, ref_hour, start, resamples=300, cpu_budget=2.0, percentiles=(5, 95), seed=None):
+        """
+        Uncertainty of the curve fit, by refitting the chosen degree on resampled forecasts.
+        All resampled series of a chunk are solved at once, through the pseudo-inverse of a stack of
+        Vandermonde matrices. Chunks stop as soon as the CPU budget is spent. compute_steps() must be called first.
+
+        :param ref_hour: reference datetime from which decimal hour = 0.0
+        :param start: first forecast datetime, no step change is searched before it
+        :param resamples: maximum number of resampled series
+        :param cpu_budget: maximum CPU time, in seconds
+        :param percentiles: lower and upper percentiles of the bands
+        :param seed: random seed, for reproducible bands
+        |:return:  {'time': [t],
+        |           'low': [altitude], 'high': [altitude],
+        |           'steps': [(time, step, earliest time, latest time)],
+        |           'resamples': number of series actually refitted,
+        |           'coverage': percent of the resampled fits between the bands, ex) 90}
+        """
+        x = np.asarray(self.x, dtype=float)
+        y = np.asarray(self.y, dtype=float)
+        one_minute = 1 / 60
+        grid = np.arange(0, x[-1], one_minute)
+
+        # centered and scaled time keeps the Vandermonde matrices well conditioned
+        center = (x[0] + x[-1]) / 2
+        half_span = max((x[-1] - x[0]) / 2, 1)
+        vander = np.vander((x - center) / half_span, self.degree + 1)
+        grid_vander = np.vander((grid - center) / half_span, self.degree + 1)
+
+        rng = np.random.default_rng(seed)
+        curves = []
+        used = 0
+        deadline = process_time() + cpu_budget
+        while used == 0 or (used < resamples and process_time() < deadline):
+            size = min(BOOTSTRAP_CHUNK, resamples - used)
+            picks = rng.integers(0, len(x), size=(size, len(x)))  # one resampled series per row
+            stacked = vander[picks]  # size x points x (degree + 1)
+            coefficients = np.einsum("bij,bj->bi", np.linalg.pinv(stacked), y[picks])  # batched least squares
+            curves.append(coefficients @ grid_vander.T)
+            used += size
+        curves = np.concatenate(curves)
+        low, high = np.percentile(curves, percentiles, axis=0)
+
+        # step changes of each resampled curve: the crossing into the same step, in the same direction,
+        # nearest to the fitted one
+        levels = np.rint(curves)
+        changes = np.sign(levels[:, 1:] - levels[:, :-1])
+        after_start = grid[1:] >= date2dhour(ref_hour, start)
+        step_bands = []
+        for time, step in zip(*self.steps):
+            if not isinstance(step, (int, np.integer)):  # [fix]
+                continue
+            t = date2dhour(ref_hour, time)
+            direction = np.sign(step - self._int_round(polyval(self.poly, t - one_minute)))
+            crossing = (changes == direction) & (levels[:, 1:] == step) & after_start
+            distance = np.where(crossing, np.abs(grid[1:] - t), np.inf)
+            nearest = np.argmin(distance, axis=1)
+            found = distance[np.arange(len(nearest)), nearest] <= STEP_SEARCH_HOURS
+            if found.any():
+                earliest, latest = np.percentile(grid[1:][nearest[found]], percentiles)
+                step_bands.append(
+                    (
+                        time,
+                        step,
+                        dhour2date(ref_hour=ref_hour, dhour=earliest),
+                        dhour2date(ref_hour=ref_hour, dhour=latest),
+                    )
+                )
+
+        return {
+            "time": [dhour2date(ref_hour=ref_hour, dhour=t) for t in grid],
+            "low": low,
+            "high": high,
+            "steps": step_bands,
+            "resamples": used,
+            "coverage": percentiles[1] - percentiles[0],
+        }
+
+
+def tested_degrees(nb_points: int) -> range:
+    """
+    Degrees tried by the leave-one-out search, 4/7 of the number of points being a reliable ceiling
+    """
+    return range((nb_points * 4) // 7)
+
+
+def leave_one_out_errors(x_vector, y_matrix, degrees) -> np.ndarray:
+    """
+    Same error as PolynomialCurveFit.best_degree(), for many stations sharing the same hours.
+    The residual of a removed point equals its full-fit residual divided by (1 - leverage),
+    so one QR factorization per degree serves every station.
+
+    :param x_vector: decimal hours shared by all stations
+    :param y_matrix: altitudes, one row per station
+    :param degrees: tested polynomial degrees
+    :return: sum of absolute leave-one-out errors, stations x degrees
+    """
+    x = np.asarray(x_vector, dtype=float)
+    y = np.atleast_2d(np.asarray(y_matrix, dtype=float))
+
+    # centered and scaled time keeps the Vandermonde matrices well conditioned
+    center = (x[0] + x[-1]) / 2
+    half_span = max((x[-1] - x[0]) / 2, 1)
+    scaled = (x - center) / half_span
+
+    errors = np.empty((y.shape[0], len(degrees)))
+    for column, degree in enumerate(degrees):
+        q, _ = np.linalg.qr(np.vander(scaled, degree + 1))
+        leverage = np.einsum("ij,ij->i", q, q)
+        residuals = y - (y @ q) @ q.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            errors[:, column] = np.abs(residuals / (1 - leverage)).sum(axis=1)
+    return np.nan_to_num(errors, nan=np.inf)
+
+
+def fit_stations(x_vector, y_matrix) -> list:
+    """
+    Degree search and curve fit of many stations at once, when their forecasts share the same hours
+
+    :param x_vector: decimal hours shared by all stations
+    :param y_matrix: altitudes, one row per station
+    :return: one PolynomialCurveFit per station, ready for compute_steps() and step_text()
+    """
+    y = np.atleast_2d(np.asarray(y_matrix, dtype=float))
+    degrees = np.asarray(tested_degrees(len(x_vector)))
+    best = degrees[np.argmin(leave_one_out_errors(x_vector, y, degrees), axis=1)]  # first minimum, as best_degree()
+
+    if (best >= len(x_vector) // 2).any():
+        warnings.warn(_("Degree abnormally high. Predictions might be unreliable."))
+
+    fits = [None] * len(y)
+    for degree in np.unique(best):
+        rows = np.flatnonzero(best == degree)
+        polys = polyfit(x_vector, y[rows].T, degree)  # one least-squares solve for all stations of that degree
+        for row, poly in zip(rows, polys.T):
+            fits[row] = PolynomialCurveFit.from_solution(x_vector, list(y[row]), int(degree), poly)
+    return fits
+
+
+FIX_MATRIX_CHUNK = 256  # candidate fix times evaluated together, bounds the size of the temporary matrices
+
+
+class FixTimeMatrix:
+    """
+    | Step schedules and corrections of one curve fit, for every candidate fix time over the next hours.
+    |
+    | The forecast altitude changes add up: calibrated at fix time f, the watch needs fit(t) - fit(f) at time t.
+    | The curve is evaluated once on the minute grid of compute_steps(). Each block of fix times is then one
+    | subtraction of the curve from itself. Only the minutes where the rounded correction changes are kept,
+    | row after row (indptr[i]:indptr[i + 1] for the i-th fix time), so any schedule is an instant lookup.
+    """
+
+    __slots__ = [
+        "ref_hour", "every", "fix_minutes", "indptr", "change_minutes", "change_steps", "hour_minutes", "corrections",
+    ]
+
+    def __init__(
+        self, curvefit: PolynomialCurveFit, ref_hour: datetime, start: datetime, first_fix: datetime, hours, every=1,
+    ):
+        """
+        :param curvefit: fitted curve, altitude change since the current pressure
+        :param ref_hour: reference datetime from which decimal hour = 0.0
+        :param start: first forecast datetime, no step change is searched before it
+        :param first_fix: earliest candidate fix time, ex) now
+        :param hours: candidate fix times span that many hours
+        :param every: minutes between two candidate fix times
+        """
+        self.ref_hour = ref_hour
+        self.every = max(int(every), 1)
+        grid = np.arange(0, curvefit.x[-1], 1 / 60)
+        curve = polyval(curvefit.poly, grid)
+        minutes = np.arange(len(grid))
+
+        first_minute = max(int(np.ceil(date2dhour(ref_hour, start) * 60 - 1e-6)), 0)
+        first_fix_minute = max(int(date2dhour(ref_hour, first_fix) * 60), first_minute)
+        last_fix_minute = min(first_fix_minute + int(hours * 60), len(grid) - 1)
+        self.fix_minutes = np.arange(first_fix_minute, last_fix_minute + 1, self.every)
+        self.hour_minutes = minutes[(minutes % 60 == 0) & (minutes >= first_minute)]
+
+        rows, columns, steps = [], [], []
+        for chunk in range(0, len(self.fix_minutes), FIX_MATRIX_CHUNK):
+            fixes = self.fix_minutes[chunk : chunk + FIX_MATRIX_CHUNK]
+            levels = np.rint(curve[np.newaxis, :] - curve[fixes, np.newaxis])
+            levels[minutes[np.newaxis, :] < fixes[:, np.newaxis]] = 0  # nothing changes before the fix
+            row, column = np.nonzero(levels[:, 1:] != levels[:, :-1])
+            rows.append(row + chunk)
+            columns.append(column + 1)
+            steps.append(levels[row, column + 1])
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=int)
+        self.change_minutes = np.concatenate(columns).astype(np.int32) if columns else np.empty(0, dtype=np.int32)
+        self.change_steps = np.concatenate(steps).astype(np.int16) if steps else np.empty(0, dtype=np.int16)
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(self.fix_minutes)))))
+
+        corrections = curve[self.hour_minutes][np.newaxis, :] - curve[self.fix_minutes, np.newaxis]
+        self.corrections = corrections.astype(np.float32)
+        self.corrections[self.hour_minutes[np.newaxis, :] < self.fix_minutes[:, np.newaxis]] = np.nan
+
+    def _minute_time(self, minute) -> datetime:
+        return self.ref_hour + timedelta(minutes=int(minute))
+
+    def fix_times(self) -> list:
+        return [self._minute_time(m) for m in self.fix_minutes]
+
+    def row(self, fix_time: datetime) -> int:
+        """
+        :param fix_time: time at which the watch is calibrated
+        :return: index of the latest candidate fix time not after fix_time
+        """
+        minute = int(date2dhour(self.ref_hour, fix_time) * 60 + 1e-6)
+        row = int(np.searchsorted(self.fix_minutes, minute, side="right")) - 1
+        if row < 0 or minute - self.fix_minutes[row] >= self.every:
+            raise ValueError(_("No prediction for a fix at {}").format(fix_time.strftime("%H:%M")))
+        return row
+
+    def steps(self, fix_time: datetime):
+        """
+        | Step schedule of a watch calibrated at fix_time, as the (times, steps) lists of PolynomialCurveFit.steps:
+        | assign it to curvefit.steps to reuse step_text().
+        |
+        | The values are not those of compute_steps(), even for a fix at the time of the run. compute_steps() rounds
+        | fit(t), the change since the observed pressure, while this rounds fit(t) - fit(fix), the change since the
+        | calibration. The two differ by fit(fix), the residual of the fit at the fix, so a step may come a minute
+        | or so earlier or later. The fix marker always comes first, then the changes strictly after the fix.
+
+        :return: ([times], [fix marker and steps])
+        """
+        row = self.row(fix_time)
+        span = slice(self.indptr[row], self.indptr[row + 1])
+        times = [self._minute_time(self.fix_minutes[row])] + [self._minute_time(m) for m in self.change_minutes[span]]
+        return times, [_("fix")] + self.change_steps[span].tolist()
+
+    def hourly_corrections(self, fix_time: datetime) -> np.ndarray:
+        """
+        :return: correction in meters at each full hour of hour_minutes, nan before the fix
+        """
+        return self.corrections[self.row(fix_time)]
+
+    def save(self, filename: str) -> None:
+        """
+        | .npz: every array, compressed, for any later lookup
+        | otherwise: CSV of the rounded corrections, one row per candidate fix time, one column per full hour,
+        | both labelled with their ISO date and time since the forecast spans more than one day
+        """
+        import csv
+        import io
+        from utils import atomic_write
+
+        if filename.lower().endswith(".npz"):
+            buffer = io.BytesIO()
+            np.savez_compressed(
+                buffer,
+                ref_hour=np.datetime64(self.ref_hour, "m"),
+                **{name: getattr(self, name) for name in self.__slots__ if name != "ref_hour"},
+            )
+            atomic_write(filename, buffer.getvalue())
+            return
+
+        text = io.StringIO()
+        writer = csv.writer(text, lineterminator="\n")
+        writer.writerow(["fix"] + [self._minute_time(m).strftime("%Y-%m-%dT%H:%M") for m in self.hour_minutes])
+        for minute, corrections in zip(self.fix_minutes, self.corrections):
+            cells = ["" if np.isnan(c) else int(np.rint(c)) for c in corrections]
+            writer.writerow([self._minute_time(minute).strftime("%Y-%m-%dT%H:%M")] + cells)
+        atomic_write(filename, text.getvalue().encode("utf-8"))
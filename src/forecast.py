@@ -25,46 +25,115 @@ SOFTWARE.
 
 from datetime import datetime
 
+import numpy as np
+
 from ISA import AtmosphericPressure, InternationalStandardAtmosphere
 
 
 class Forecast:
-    __slots__ = ["values"]
+    """
+    Hourly forecast stored in two growable arrays (datetime64 and float64): 16 bytes per point
+    """
+
+    __slots__ = ["time_buffer", "pressure_buffer", "size", "in_order"]
+
+    INITIAL_CAPACITY = 64
 
     def __init__(self):
-        self.values = []
+        self.time_buffer = np.empty(self.INITIAL_CAPACITY, dtype="datetime64[us]")
+        self.pressure_buffer = np.empty(self.INITIAL_CAPACITY, dtype=np.float64)
+        self.size = 0
+        self.in_order = True  # chronological order, kept up to date on every append
 
-    def add(self, time: datetime, pressure: AtmosphericPressure) -> None:
-        self.values.append({"time": time, "pressure": AtmosphericPressure(hectopascal=pressure)})
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, extra: int) -> None:
+        needed = self.size + extra
+        if needed > len(self.time_buffer):
+            capacity = max(needed, 2 * len(self.time_buffer))
+            self.time_buffer = np.resize(self.time_buffer, capacity)
+            self.pressure_buffer = np.resize(self.pressure_buffer, capacity)
 
-    def _get(self, key: str):
-        return [_point[key] for _point in self.values]
+    def add(self, time: datetime, pressure: AtmosphericPressure) -> None:
+        if not AtmosphericPressure.MINIMUM < pressure < AtmosphericPressure.MAXIMUM:
+            raise ValueError(AtmosphericPressure.OUT_OF_RANGE)
+
+        self._reserve(1)
+        _t = np.datetime64(time, "us")
+        self.in_order = self.in_order and (self.size == 0 or self.time_buffer[self.size - 1] <= _t)
+        self.time_buffer[self.size] = _t
+        self.pressure_buffer[self.size] = pressure
+        self.size += 1
+
+    def add_many(self, times, pressures) -> None:
+        """
+        Appends many points at once, validated together
+
+        :param times: datetimes
+        :param pressures: pressures in hPa
+        """
+        _t = np.asarray(times, dtype="datetime64[us]")
+        _p = np.asarray(pressures, dtype=np.float64)
+        AtmosphericPressure.validate_many(_p)
+
+        self._reserve(len(_t))
+        if len(_t):
+            previous = self.time_buffer[self.size - 1] if self.size else _t[0]
+            self.in_order = self.in_order and previous <= _t[0] and bool((_t[1:] >= _t[:-1]).all())
+        self.time_buffer[self.size : self.size + len(_t)] = _t
+        self.pressure_buffer[self.size : self.size + len(_p)] = _p
+        self.size += len(_t)
+
+    def _index(self, time: datetime) -> int:
+        found = np.flatnonzero(self.time_buffer[: self.size] == np.datetime64(time, "us"))
+        if len(found) == 0:
+            raise ValueError("{} is not in the forecast".format(time))
+        return int(found[0])
 
     def get_pressure(self, time: datetime) -> AtmosphericPressure:
-        return self.pressures()[self.times().index(time)]
+        return float(self.pressure_buffer[self._index(time)])
 
     def get_altitude(self, time: datetime):
-        return self.altitudes()[self.times().index(time)]
+        return InternationalStandardAtmosphere().altitude(self.get_pressure(time))
 
     def get_delta_altitude(self, time: datetime, *, p_ref: AtmosphericPressure):
-        return self.delta_altitudes(p_ref=p_ref)[self.times().index(time)]
+        return InternationalStandardAtmosphere().delta_altitude(p_ref=p_ref, current_p=self.get_pressure(time))
+
+    def pressure_array(self) -> np.ndarray:
+        return self.pressure_buffer[: self.size]
+
+    def time_array(self) -> np.ndarray:
+        return self.time_buffer[: self.size]
 
     def pressures(self):
-        return [_i.value for _i in self._get("pressure")]
+        return self.pressure_array().tolist()
 
     def altitudes(self):
-        _isa = InternationalStandardAtmosphere()
-        return [_isa.altitude(i.value) for i in self._get("pressure")]
+        return InternationalStandardAtmosphere().altitude(self.pressure_array()).tolist()
 
     def delta_altitudes(self, p_ref):
-        _isa = InternationalStandardAtmosphere()
-        return [_isa.delta_altitude(p_ref=p_ref, current_p=i.value) for i in self._get("pressure")]
+        return InternationalStandardAtmosphere().delta_altitude(p_ref=p_ref, current_p=self.pressure_array()).tolist()
 
     def times(self):
-        return self._get("time")
-
-    def sorted_by(self, key, reverse=False) -> bytearray:
-        return sorted(self.values, key=lambda _i: _i[key], reverse=reverse)
-
-    def reorder_chronologically(self, reverse=False) -> bytearray:
-        self.values = self.sorted_by("time", reverse)
+        return self.time_array().tolist()
+
+    def sorted_by(self, key, reverse=False) -> np.ndarray:
+        """
+        :param key: 'time' or 'pressure'
+        :param reverse: descending order
+        :return: indexes of the points in that order (stable)
+        """
+        _values = self.time_array() if key == "time" else self.pressure_array()
+        if not reverse:
+            return np.argsort(_values, kind="stable")
+        # descending, equal values kept in their original order: ascending sort of the reversed values, read backwards
+        return (len(_values) - 1 - np.argsort(_values[::-1], kind="stable"))[::-1]
+
+    def reorder_chronologically(self, reverse=False) -> None:
+        if self.in_order and not reverse:  # appended in order, nothing to do
+            return
+        _order = self.sorted_by("time", reverse)
+        self.time_buffer[: self.size] = self.time_array()[_order]
+        self.pressure_buffer[: self.size] = self.pressure_array()[_order]
+        self.in_order = not reverse or self.size < 2
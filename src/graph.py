@@ -24,10 +24,19 @@ SOFTWARE.
 """
 
 from abc import abstractmethod
+from datetime import timedelta
+from io import BytesIO
+from time import perf_counter
 
 import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+import numpy as np
 from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.gridspec import GridSpec
 from matplotlib.patches import Rectangle
+from matplotlib.projections import register_projection
 from matplotlib.ticker import MultipleLocator, FormatStrFormatter, NullFormatter
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 
@@ -54,22 +63,188 @@ class NoPanXAxes(Axes):
         Axes.drag_pan(self, button, "x", _x, _y)  # pretend key=='x'
 
 
+class BlitManager:
+    """
+    Redraws only a few animated artists over a cached copy of the figure.
+    The background is refreshed on every full draw (resize, zoom, pan); in between,
+    updates are throttled to at most one every `min_interval` seconds, the last one
+    being deferred with a single-shot timer so that the final state is always shown
+    """
+
+    __slots__ = ["canvas", "artists", "background", "min_interval", "last_update", "pending", "timer", "cid"]
+
+    def __init__(self, canvas, artists=(), min_interval: float = 1 / 60):
+        self.canvas = canvas
+        self.artists = []
+        self.background = None
+        self.min_interval = min_interval
+        self.last_update = 0.0
+        self.pending = False
+        self.timer = None
+        for artist in artists:
+            self.add_artist(artist)
+        self.cid = canvas.mpl_connect("draw_event", self.on_draw)
+
+    def add_artist(self, artist):
+        artist.set_animated(True)  # left out of full draws, hence out of the cached background
+        self.artists.append(artist)
+
+    def on_draw(self, _event=None):
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_animated()
+        self.pending = False
+
+    def _draw_animated(self):
+        figure = self.canvas.figure
+        for artist in self.artists:
+            figure.draw_artist(artist)
+
+    def update(self, force: bool = False) -> bool:
+        """ Blits the animated artists; returns False when the update was throttled away """
+        if self.pending:  # a full redraw is already on its way and will draw them too
+            return False
+        now = perf_counter()
+        if not force and now - self.last_update < self.min_interval:
+            self._defer(self.min_interval - (now - self.last_update))
+            return False
+        self.last_update = now
+        if self.background is None:
+            self.pending = True
+            self.canvas.draw_idle()
+        else:
+            self.canvas.restore_region(self.background)
+            self._draw_animated()
+            self.canvas.blit(self.canvas.figure.bbox)
+            self.canvas.flush_events()
+        return True
+
+    def _defer(self, delay: float):
+        if self.timer is None:
+            self.timer = self.canvas.new_timer(interval=max(1, int(1000 * delay)))
+            self.timer.single_shot = True
+            self.timer.add_callback(self._flush)
+            self.timer.start()
+
+    def _flush(self):
+        self.timer = None
+        self.update(force=True)
+
+    def full_redraw(self):
+        """ For changes to non-animated artists (limits, autoscale) """
+        self.pending = True
+        self.canvas.draw_idle()
+
+
+class CursorReadout:
+    """
+    Time and altitude under the mouse pointer, in the corner of the top subplot
+    """
+
+    __slots__ = ["ax", "text", "blit"]
+
+    def __init__(self, ax: Axes, blit: BlitManager = None):
+        self.ax = ax
+        self.text = ax.text(
+            # fmt: off
+            0.01, 0.98, "",
+            transform=ax.transAxes, horizontalalignment="left", verticalalignment="top",
+            fontsize="small", zorder=12,
+            # fmt: on
+        )
+        self.blit = blit
+
+    def hover(self, event):
+        if event.inaxes is self.ax and event.xdata is not None:
+            label = "{} {:+.1f} m".format(
+                no_leading_zeros(mdates.num2date(event.xdata).strftime("#%H:%M")), event.ydata
+            )
+        else:
+            label = ""
+        if label == self.text.get_text():
+            return
+        self.text.set_text(label)
+        if self.blit is not None:
+            self.blit.update()
+
+
+def min_max_decimate(x, y, buckets: int):
+    """
+    Shape-preserving downsampling: keeps the first and last points and, in each of `buckets`
+    equal slices, the lowest and the highest point. No extremum is lost at that resolution.
+
+    :return: indices of the kept points, in increasing order
+    """
+    n = len(y)
+    if n <= 2 * buckets + 2:
+        return np.arange(n)
+    size = -(-n // buckets)  # ceiling
+    padded = np.full(size * buckets, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    with np.errstate(invalid="ignore"):
+        filled = ~np.all(np.isnan(padded), axis=1)  # the last slices may be pure padding
+    lows = offsets[filled] + np.nanargmin(padded[filled], axis=1)
+    highs = offsets[filled] + np.nanargmax(padded[filled], axis=1)
+    return np.unique(np.concatenate(([0], lows, highs, [n - 1])))
+
+
+class LevelOfDetail:
+    """
+    Keeps the full resolution of a line aside and only hands matplotlib the points visible
+    in the current view, downsampled to about one point per `pixels` screen pixels.
+    Resampled on every zoom/pan (xlim_changed), before the redraw that follows it.
+    """
+
+    __slots__ = ["ax", "line", "x", "y", "pixels", "cid"]
+
+    def __init__(self, ax: Axes, line, x, y, pixels: float = 2):
+        self.ax = ax
+        self.line = line
+        self.pixels = pixels
+        self.set_data(x, y)
+        self.cid = ax.callbacks.connect("xlim_changed", self.update)
+
+    def set_data(self, x, y):
+        self.x = mdates.date2num(x) if np.issubdtype(np.asarray(x).dtype, np.datetime64) else np.asarray(x, float)
+        self.y = np.asarray(y, dtype=float)
+        self.update()
+
+    def update(self, *_):
+        left, right = sorted(self.ax.get_xlim())
+        first = max(np.searchsorted(self.x, left) - 1, 0)  # one point beyond each edge, for continuity
+        last = min(np.searchsorted(self.x, right, side="right") + 1, len(self.x))
+        buckets = max(int(self.ax.bbox.width / self.pixels) // 2, 1)  # min and max per bucket
+        keep = first + min_max_decimate(self.x[first:last], self.y[first:last], buckets)
+        self.line.set_data(self.x[keep], self.y[keep])
+
+    @property
+    def vertices(self) -> int:
+        return len(self.line.get_xdata(orig=False))
+
+
 class LinkedRectangles:  # TODO: not sure it needs to be a class
     """
     links two rectangles to two axes. Any zoom/pan propagates to the two rectangles
     """
 
-    __slots__ = ["r", "aa"]
+    __slots__ = ["r", "aa", "blit", "redraw"]
 
     def __init__(self, ax1: Axes, r1: Rectangle, ax2: Axes, r2: Rectangle):
         self.r = [r1, r2]
         self.aa = [ax1, ax2]
+        self.blit = None
+        self.redraw = True  # False while limits are set programmatically (non-GUI canvases draw_idle at once)
 
     def update(self, *_):
         self.r[0].set_bounds(self.aa[0].viewLim.bounds)
         self.r[1].set_bounds(self.aa[1].viewLim.bounds)
-        self.aa[0].figure.canvas.draw_idle()
-        self.aa[1].figure.canvas.draw_idle()
+        if not self.redraw:
+            return
+        if self.blit is None:
+            self.aa[0].figure.canvas.draw_idle()  # both axes share the same canvas
+        else:
+            self.blit.update()
 
 
 class MyMatplotlibTools:
@@ -130,7 +305,9 @@ class MyMatplotlibTools:
 
     @staticmethod
     def format_altitude_tick(ax, shift):
-        say = ax.secondary_yaxis("right", functions=(lambda a: shift + a, lambda a: a - shift))
+        """ :param shift: elevation, or a callable returning it (read at every draw) """
+        offset = shift if callable(shift) else lambda: shift
+        say = ax.secondary_yaxis("right", functions=(lambda a: offset() + a, lambda a: a - offset()))
         say.yaxis.set_major_locator(MultipleLocator(base=5))
         say.yaxis.set_major_formatter(FormatStrFormatter("%.0f m"))
 
@@ -188,7 +365,7 @@ class MyMatplotlibTools:
         )
         rect.r[1].set_bounds(*bottom.viewLim.bounds)
 
-        bottom.callbacks.connect("lim_changed", rect.update)
+        bottom.callbacks.connect("xlim_changed", rect.update)
         bottom.callbacks.connect("ylim_changed", rect.update)
         top.callbacks.connect("xlim_changed", rect.update)
         top.callbacks.connect("ylim_changed", rect.update)
@@ -215,3 +392,332 @@ class MyMatplotlibTools:
         inset.spines["right"].set_alpha(0.2)
 
         return inset
+
+
+class AltimeterFigure:
+    """
+    Layout of the graph (grid, subplots, secondary axes, insets, locators, formatters, empty artists),
+    built once. render() then only swaps the data, limits, labels and titles of one station/run,
+    so that rendering many graphs costs a single layout.
+    All times handed to matplotlib are converted to matplotlib date numbers.
+    """
+
+    MARGIN = 15  # minutes, around the first forecast and the last visible full hour
+    PRESSURE_TICKS = (20, 10, 5)  # hPa between major ticks, for wide, medium and narrow pressure ranges
+
+    def __init__(self, footer: str, loc: str = "lower right", offscreen: bool = False):
+        """
+        :param offscreen: plain Agg figure, outside pyplot: no window, no GUI toolkit (ex: worker processes)
+        """
+        self.mtools = MyMatplotlibTools()
+        register_projection(NoPanXAxes)
+        self.elevation = 0.0
+
+        if offscreen:
+            self.fig = Figure(dpi=96, figsize=(16, 9))
+            FigureCanvasAgg(self.fig)
+        else:
+            self.fig = plt.figure(dpi=96, figsize=(16, 9))
+        self.fig.text(
+            # fmt: off
+            0.95, 0.01, footer,
+            horizontalalignment="right", alpha=0.8, fontsize="x-small",
+            # fmt: on
+        )
+
+        # two subplots on a grid system
+        self.gs = GridSpec(figure=self.fig, ncols=1, nrows=2, height_ratios=[3, 1], hspace=0.1, bottom=0.07)
+        self.top = self.fig.add_subplot(self.gs[0])
+        self.bottom = self.fig.add_subplot(self.gs[1], sharex=self.top, projection="No Pan X Axes")
+
+        # formatting the top (altitude) graph
+        self.top.set_ylabel(_("$\\Delta$altitude, $m$"))
+        self.mtools.format_date_ticks(self.top)
+        self.mtools.format_altitude_tick(self.top, shift=lambda: self.elevation).set_ylabel(_("altitude, $m$"))
+        self.mtools.set_grid(self.top)
+        self.inset_altitude, self.rects = self.mtools.create_inset(self.top, self.bottom, self.gs, loc)
+        self.rects.redraw = False  # nothing worth drawing before render()
+
+        # formatting the bottom (pressure) graph
+        self.mtools.set_grid(self.bottom)
+        self.inset_pressure = self.mtools.add_inset(self.top, self.bottom, self.rects, self.gs, loc)
+
+        # empty artists, filled by render()
+        (self.dotted_line,) = self.top.plot(
+            [], [], color="red", marker="", linestyle="dotted", label="_nolegend_", zorder=8,
+        )
+        self.dotted_lod = LevelOfDetail(self.top, self.dotted_line, [], [])
+        (self.step_line,) = self.top.step([], [], where="post", color="red", marker="", linestyle="solid", zorder=9)
+        self.fix_marker = self.top.scatter([], [], color="black", marker=9, zorder=11)
+        (self.altitude_overview,) = self.inset_altitude.plot(
+            [], [], color="red", alpha=0.95, picker=lambda hit, evt: (True, {"inset": "altitude"}),
+        )
+        (self.pressure_line,) = self.bottom.plot(
+            [], [], color="tab:blue", marker="o", markersize=3.5, linestyle="--", label=_("Atmospheric Pressure"),
+        )
+        (self.pressure_overview,) = self.inset_pressure.plot(
+            [], [], color="tab:blue", alpha=0.95, picker=lambda hit, evt: (True, {"inset": "pressure"}),
+        )
+        self.forecast_points = None  # errorbar container and band are rebuilt, their geometry is not swappable
+        self.band = None
+        self.readout = CursorReadout(self.top)  # empty until hovered, hence invisible on saved graphs
+        self.rects.redraw = True
+
+    def set_title(self, title: str, window_title: str = None):
+        self.top.set_title(title)
+        if window_title is not None and self.fig.canvas.manager is not None:
+            self.fig.canvas.manager.set_window_title(window_title)
+
+    def render(
+        self,
+        start,
+        visible_full_hour,
+        visible_hours: int,
+        elevation: float,
+        prediction: dict,
+        curve: dict,
+        steps: dict,
+        times,
+        y,
+        z,
+        fix_hour,
+        fix_label: str,
+        fit_label: str,
+        bands: dict = None,
+        band_label: str = None,
+    ):
+        """
+        Swaps in the data of one run
+
+        :param start: first forecast datetime
+        :param visible_full_hour: last full hour shown initially
+        :param visible_hours: hours shown initially, for the altitude limits
+        :param elevation: station elevation, for the right altitude axis
+        :param prediction: PolynomialCurveFit.prediction_dict()
+        :param curve: PolynomialCurveFit.curve_arrays()
+        :param steps: PolynomialCurveFit.step_vertices()
+        :param times: forecast datetimes
+        :param y: forecast delta altitudes
+        :param z: forecast pressures, hPa
+        :param bands: PolynomialCurveFit.bootstrap(), or None
+        """
+        margin = timedelta(minutes=self.MARGIN + 5)
+        self.elevation = elevation
+        self.rects.redraw = False  # the export, or the next GUI draw, redraws everything anyway
+        try:
+            self.top.set_xlim(mdates.date2num(start - margin), mdates.date2num(visible_full_hour + margin))
+            self.mtools.set_ylimits(self.top, y, visible_hours)
+            self.set_pressure_axis(z)
+            self.rects.update()
+        finally:
+            self.rects.redraw = True
+
+        x = mdates.date2num(times)
+        self.dotted_lod.set_data(curve["time"], curve["dotted line"])
+        self.step_line.set_data(mdates.date2num(steps["time"]), steps["steps"])
+        self.step_line.set_label(fit_label)
+        self.fix_marker.set_offsets([[mdates.date2num(fix_hour), 0]])
+        self.fix_marker.set_label(fix_label)
+        self.pressure_line.set_data(x, z)
+        for overview, values in ((self.altitude_overview, y), (self.pressure_overview, z)):
+            overview.set_data(x, values)
+            overview.axes.relim()
+            overview.axes.autoscale_view()
+
+        if self.forecast_points is not None:
+            self.forecast_points.remove()
+        self.forecast_points = self.top.errorbar(
+            # fmt: off
+            mdates.date2num(prediction["time"]), prediction["altitude"],
+            yerr=prediction["error"],
+            color="green", marker="o", linestyle="none", markersize=5,
+            label=_("Hourly Forecast"),
+            zorder=10,
+            # fmt: on
+        )
+
+        if self.band is not None:
+            self.band.remove()
+            self.band = None
+        if bands is not None:
+            self.band = self.top.fill_between(
+                # fmt: off
+                mdates.date2num(bands["time"]), bands["low"], bands["high"],
+                color="red", alpha=0.12, linewidth=0,
+                label=band_label,
+                zorder=7,
+                # fmt: on
+            )
+
+        self.top.legend()
+        self.bottom.legend()
+
+    def set_pressure_axis(self, z):
+        scale = (max(z) - min(z)) // 5
+        base = self.PRESSURE_TICKS[0] if scale > 5 else self.PRESSURE_TICKS[1] if scale > 2 else self.PRESSURE_TICKS[2]
+
+        self.bottom.set_ylim(260, 1100)  # pressure limits of Casio v3
+        self.bottom.yaxis.set_major_locator(MultipleLocator(base=base))
+        self.bottom.yaxis.set_minor_locator(MultipleLocator(base=1))
+        old_ticks = self.bottom.get_yticks()
+        self.bottom.set_yticks(list(old_ticks) + [1013.25])
+        self.bottom.set_yticklabels(list(map(lambda new: "{:.0f} hPa".format(new), old_ticks)) + ["MSL$_{ISA}$"])
+        self.bottom.set_ylim(  # multiple of 5, just below the minimum pressure and just above maximum pressure
+            # fmt: off
+            round(2 * (min(z) - 2.5), -1) // 2,
+            round(2 * (max(z) + 2.5), -1) // 2,
+            # fmt: on
+        )
+
+
+def render_image(footer: str, title: str, run: dict, image_format: str, **savefig_kwargs) -> bytes:
+    """
+    Renders one graph off-screen, ex) in a worker process while the main program carries on
+
+    :param run: AltimeterFigure.render() arguments
+    :param image_format: savefig() format, ex) "png"
+    :return: image content
+    """
+    figure = AltimeterFigure(footer, offscreen=True)
+    figure.set_title(title)
+    figure.render(**run)
+    image = BytesIO()
+    figure.fig.savefig(image, format=image_format, **savefig_kwargs)
+    return image.getvalue()
+
+
+if __name__ == "__main__":
+    # callback cost per mouse event: full redraw (what draw_idle ends up doing) vs blitting
+    from datetime import datetime
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from matplotlib.backend_bases import MouseEvent
+
+    t0 = datetime(2020, 6, 1, 12)
+    times = [t0 + timedelta(minutes=i) for i in range(12 * 60)]
+    fig = plt.figure(dpi=96, figsize=(16, 9))
+    gs = GridSpec(figure=fig, ncols=1, nrows=2, height_ratios=[3, 1], hspace=0.1, bottom=0.07)
+    top = fig.add_subplot(gs[0])
+    bottom = fig.add_subplot(gs[1], sharex=top)
+    top.plot(times, [(i % 97) / 3 for i in range(len(times))], color="red")
+    bottom.plot(times, [1000 + (i % 61) / 10 for i in range(len(times))], color="tab:blue")
+    _inset, rects = MyMatplotlibTools.create_inset(top, bottom, gs, "lower right")
+    MyMatplotlibTools.add_inset(top, bottom, rects, gs, "lower right")
+    readout = CursorReadout(top)
+    fig.canvas.draw()
+
+    x_pixels = top.bbox.x0 + (top.bbox.width - 2) * (0.5 + 0.5 * np.sin(np.arange(500) / 20))
+    events = [MouseEvent("motion_notify_event", fig.canvas, x, top.bbox.y0 + top.bbox.height / 2) for x in x_pixels]
+
+    def per_event(callback) -> float:
+        start = perf_counter()
+        for event in events:
+            callback(event)
+        return (perf_counter() - start) / len(events) * 1000
+
+    def full_redraw(event):
+        readout.hover(event)
+        fig.canvas.draw()
+
+    print(f"full redraw:         {per_event(full_redraw):7.2f} ms/event")
+
+    blit = BlitManager(fig.canvas, [rects.r[0], rects.r[1], readout.text], min_interval=0)
+    rects.blit = blit
+    readout.blit = blit
+    fig.canvas.draw()
+    print(f"blit, unthrottled:   {per_event(readout.hover):7.2f} ms/event")
+
+    blit.min_interval = 1 / 60
+    print(f"blit, 60 Hz ceiling: {per_event(readout.hover):7.2f} ms/event (bursts of events, most dropped)")
+
+    # level of detail: vertices and render time of the fit curves, full minute grid vs change points/decimated
+    import warnings
+
+    from curvefit import PolynomialCurveFit
+
+    hours = np.arange(36.0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # polyfit conditioning of the higher tested degrees
+        fit = PolynomialCurveFit(list(hours), list(30 * np.sin(hours / 9) + hours / 2))
+    full = fit.curvefit_dict(t0, margin=15)
+    curve = fit.curve_arrays(t0, margin=15)
+    steps = fit.step_vertices(t0, margin=0)
+    steps_full = fit.curvefit_dict(t0, margin=0)
+
+    def render(lod: bool, hours_shown: float):
+        figure = plt.figure(dpi=96, figsize=(16, 9))
+        ax = figure.add_subplot()
+        if lod:
+            (dotted,) = ax.plot("time", "dotted line", data=curve, color="red", linestyle="dotted")
+            # callbacks are weak references: the figure keeps the resampler alive for the set_xlim() below
+            figure.dotted_lod = LevelOfDetail(ax, dotted, curve["time"], curve["dotted line"])
+            ax.step("time", "steps", data=steps, where="post", color="red")
+        else:
+            ax.plot("time", "dotted line", data=full, color="red", linestyle="dotted")
+            ax.step("time", "steps", data=steps_full, where="post", color="red")
+        ax.set_xlim(t0, t0 + timedelta(hours=hours_shown))
+        vertices = sum(len(line.get_xdata()) for line in ax.get_lines())
+        figure.canvas.draw()
+        start = perf_counter()
+        for _i in range(50):
+            for line in ax.get_lines():  # the curves alone, without ticks and labels
+                ax.draw_artist(line)
+        elapsed = (perf_counter() - start) / 50 * 1000
+        plt.close(figure)
+        return vertices, elapsed
+
+    for hours_shown in (6, 35):
+        (v_full, t_full), (v_lod, t_lod) = render(False, hours_shown), render(True, hours_shown)
+        print(
+            f"{hours_shown:2d} h shown: {v_full:5d} -> {v_lod:4d} vertices, "
+            f"{t_full:6.1f} -> {t_lod:6.1f} ms to draw the curves"
+        )
+
+    # layout cost: one figure built per station vs one template whose data is swapped per station
+    import builtins
+
+    if not hasattr(builtins, "_"):
+        builtins._ = str  # untranslated labels, as when run without translation.py
+
+    def station_run(i: int) -> dict:
+        altitudes = 30 * np.sin(hours / (6 + i)) + i
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            station_fit = PolynomialCurveFit(list(hours), list(altitudes))
+        return dict(
+            start=t0,
+            visible_full_hour=t0 + timedelta(hours=7),
+            visible_hours=7,
+            elevation=100.0 * i,
+            prediction=station_fit.prediction_dict(t0),
+            curve=station_fit.curve_arrays(t0, margin=AltimeterFigure.MARGIN),
+            steps=station_fit.step_vertices(t0, margin=0),
+            times=[t0 + timedelta(hours=h) for h in hours],
+            y=list(altitudes),
+            z=list(1013.25 - altitudes / 8.3),
+            fix_hour=t0 + timedelta(hours=3),
+            fix_label="Fix",
+            fit_label="degree {}".format(station_fit.degree),
+        )
+
+    runs = [station_run(i) for i in range(8)]
+
+    start = perf_counter()
+    for run in runs:
+        template = AltimeterFigure(footer="DR-Altimeter")
+        template.set_title("station")
+        template.render(**run)
+        template.fig.savefig(BytesIO(), format="png")
+        plt.close(template.fig)
+    rebuilt = (perf_counter() - start) / len(runs) * 1000
+
+    start = perf_counter()
+    template = AltimeterFigure(footer="DR-Altimeter")
+    for run in runs:
+        template.set_title("station")
+        template.render(**run)
+        template.fig.savefig(BytesIO(), format="png")
+    reused = (perf_counter() - start) / len(runs) * 1000
+    print(f"{len(runs)} stations: {rebuilt:.0f} ms per graph with a new figure, {reused:.0f} ms with the template")
@@ -0,0 +1,189 @@
+#! python3
+"""
+MIT License
+
+Copyright (c) 2020 Walter Wlodarski
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import csv
+import json
+import logging
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from archive import ForecastArchive
+from ISA import AtmosphericPressure
+from forecast import Forecast
+
+FIELDS = ["station", "run", "time", "pressure", "elevation"]  # only time and pressure are required
+MIN_POINTS = 4  # fewer forecast points than this cannot be fitted reliably, the run is skipped
+RUN_SPAN = np.timedelta64(7, "D")  # longest time between a run and its last forecast point in the archive
+
+
+class ForecastRun:
+    """
+    One run read from a file: its first point is the pressure observed at the station, as when scraping
+    """
+
+    __slots__ = ["station", "run", "elevation", "forecast", "p_initial", "times", "pressures"]
+
+    def __init__(self, station: str, run: datetime, elevation: int):
+        self.station = station
+        self.run = run
+        self.elevation = elevation
+        self.forecast = Forecast()
+        self.p_initial = None
+        self.times, self.pressures = [], []  # buffered until the run is complete, then added at once
+
+    def add(self, time: datetime, pressure: float) -> None:
+        if not AtmosphericPressure.MINIMUM < pressure < AtmosphericPressure.MAXIMUM:
+            raise ValueError(AtmosphericPressure.OUT_OF_RANGE)
+        self.times.append(time)
+        self.pressures.append(pressure)
+
+    def complete(self):
+        self.forecast.add_many(self.times, self.pressures)
+        self.p_initial = self.pressures[0] if self.pressures else None
+        self.times, self.pressures = [], []
+        return self
+
+
+def _as_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).strip())
+
+
+def csv_rows(lines):
+    """
+    Rows of a CSV file with a header line naming the columns of FIELDS, in any order.
+    A line that cannot be parsed is yielded as its csv.Error, for read_runs() to skip.
+    """
+    reader = csv.DictReader(lines)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as error:
+            row = error
+        yield row
+
+
+def json_rows(lines):
+    """
+    Rows of a JSON lines file, one object per line with the keys of FIELDS.
+    A line that cannot be parsed is yielded as its error, for read_runs() to skip.
+    """
+    for line in lines:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                yield error
+
+
+def archive_rows(folder: str):
+    """
+    Rows of every run of a ForecastArchive, station by station and month by month,
+    so that no more than two months of one station are read at once
+    """
+    archive = ForecastArchive(folder)
+    for station in archive.stations():
+        for partition in sorted((archive.root / station).glob("????-??")):
+            month = np.datetime64(partition.name, "M")
+            first, last = month.astype("datetime64[s]"), (month + 1).astype("datetime64[s]") - 1
+            runs = archive.query(station, first, last, "runs")
+            points = archive.query(station, first - RUN_SPAN, last + RUN_SPAN, "points")
+            for run, elevation in zip(runs["run"], runs["elevation"]):
+                mine = points["run"] == run
+                for time, pressure in zip(points["time"][mine].tolist(), points["pressure"][mine].tolist()):
+                    yield {
+                        "station": station,
+                        "run": run.tolist(),
+                        "time": time,
+                        "pressure": pressure,
+                        "elevation": int(elevation),
+                    }
+
+
+def _chain(first_line: str, lines):
+    yield first_line
+    yield from lines
+
+
+def rows_of(source: str):
+    """
+    :param source: CSV file, JSON lines file (.jsonl, .ndjson, .json), archive folder, or - for the standard input,
+                   whose format is recognized from its first line
+    :return: iterator of rows, read as they are needed
+    """
+    if source != "-" and Path(source).is_dir():
+        yield from archive_rows(source)
+        return
+
+    if source == "-":
+        lines = iter(sys.stdin)
+        first_line = next(lines, "")
+        is_json = first_line.lstrip().startswith("{")
+        lines = _chain(first_line, lines)
+        yield from json_rows(lines) if is_json else csv_rows(lines)
+        return
+
+    with open(source, newline="", encoding="utf-8") as file:
+        if Path(source).suffix.lower() in (".jsonl", ".ndjson", ".json"):
+            yield from json_rows(file)
+        else:
+            yield from csv_rows(file)
+
+
+def read_runs(source: str):
+    """
+    | Groups consecutive rows into runs, one run in memory at a time, however large the source.
+    |
+    | A new run starts whenever the station or the run time changes. Without a run column, each station's block of
+    | rows is one run whose fix time is its first row. Malformed rows are logged and skipped.
+
+    :param source: see rows_of()
+    :return: iterator of ForecastRun
+    """
+    current, key = None, None
+    for number, row in enumerate(rows_of(source), start=1):
+        try:
+            if isinstance(row, Exception):
+                raise row
+            time = _as_datetime(row["time"])
+            pressure = float(row["pressure"])
+            if current is None or (row.get("station"), row.get("run")) != key:  # compared as read, parsed once
+                station = str(row.get("station") or "")
+                run = _as_datetime(row["run"]) if row.get("run") not in (None, "") else time
+                elevation = int(float(row.get("elevation") or 0))
+                if current is not None:
+                    yield current.complete()
+                current, key = ForecastRun(station, run, elevation), (row.get("station"), row.get("run"))
+            current.add(time=time, pressure=pressure)
+        except (KeyError, TypeError, ValueError, AttributeError, csv.Error) as error:
+            logging.warning("Row %d skipped (%s): %s", number, error, row)
+    if current is not None:
+        yield current.complete()
@@ -0,0 +1,229 @@
+#! python3
+"""
+MIT License
+
+Copyright (c) 2020 Walter Wlodarski
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+from time import perf_counter
+
+from utils import atomic_write
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)  # seconds
+MAX_LABEL_SETS = 32  # per metric; further label sets share a single "overflow" child, so memory stays bounded
+
+
+class Counter:
+    __slots__ = ["value"]
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Histogram:
+    """ Fixed buckets: a few counters per metric, whatever the number of observations """
+
+    __slots__ = ["bounds", "counts", "sum", "count"]
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list:
+        total = 0
+        cumulated = []
+        for count in self.counts:
+            total += count
+            cumulated.append(total)
+        return cumulated
+
+
+class MetricsRegistry:
+    """
+    | Counters and histograms of one process, exported as Prometheus text or as a JSON snapshot
+    |
+    |   METRICS.inc("fit_degree_total", "Chosen polynomial degrees", degree=3)
+    |   with METRICS.timer("fit_seconds", "Polynomial curve fit"):
+    |       ...
+    """
+
+    __slots__ = ["families", "lock"]
+
+    def __init__(self):
+        self.families = {}  # name -> [kind, help, buckets, {label items: Counter or Histogram}]
+        self.lock = Lock()
+
+    def _child(self, kind: str, name: str, help_text: str, buckets, labels: dict):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self.lock:
+            family = self.families.setdefault(name, [kind, help_text, buckets, {}])
+            children = family[3]
+            child = children.get(key)
+            if child is None:
+                if len(children) >= MAX_LABEL_SETS:
+                    key = (("overflow", "true"),)
+                    child = children.get(key)
+                if child is None:
+                    child = Counter() if kind == "counter" else Histogram(buckets)
+                    children[key] = child
+            return child
+
+    def counter(self, name: str, help_text: str, **labels) -> Counter:
+        return self._child("counter", name, help_text, None, labels)
+
+    def histogram(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS, **labels) -> Histogram:
+        return self._child("histogram", name, help_text, buckets, labels)
+
+    @contextmanager
+    def timer(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS, **labels):
+        """ Observes the duration of the block, in seconds, even when it raises """
+        histogram = self.histogram(name, help_text, buckets, **labels)
+        start = perf_counter()
+        try:
+            yield histogram
+        finally:
+            with self.lock:
+                histogram.observe(perf_counter() - start)
+
+    def inc(self, name: str, help_text: str, amount: float = 1.0, **labels):
+        counter = self.counter(name, help_text, **labels)
+        with self.lock:
+            counter.inc(amount)
+
+    def observe(self, name: str, help_text: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels):
+        histogram = self.histogram(name, help_text, buckets, **labels)
+        with self.lock:
+            histogram.observe(value)
+
+    @staticmethod
+    def _labels(key: tuple, extra: tuple = ()) -> str:
+        items = key + extra
+        if not items:
+            return ""
+        return "{" + ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in items) + "}"
+
+    def prometheus_text(self) -> str:
+        """ Prometheus text exposition format, version 0.0.4 """
+        lines = []
+        with self.lock:
+            for name, (kind, help_text, _buckets, children) in sorted(self.families.items()):
+                lines.append("# HELP {} {}".format(name, help_text))
+                lines.append("# TYPE {} {}".format(name, kind))
+                for key, child in sorted(children.items()):
+                    if kind == "counter":
+                        lines.append("{}{} {}".format(name, self._labels(key), repr(child.value)))
+                        continue
+                    bounds = [repr(float(b)) for b in child.bounds] + ["+Inf"]
+                    for bound, total in zip(bounds, child.cumulative()):
+                        lines.append("{}_bucket{} {}".format(name, self._labels(key, (("le", bound),)), total))
+                    lines.append("{}_sum{} {}".format(name, self._labels(key), repr(child.sum)))
+                    lines.append("{}_count{} {}".format(name, self._labels(key), child.count))
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """ JSON-ready copy: {name: [{'labels': {...}, 'value': x} or {'labels', 'buckets', 'sum', 'count'}]} """
+        content = {}
+        with self.lock:
+            for name, (kind, _help, _buckets, children) in sorted(self.families.items()):
+                content[name] = [
+                    {"labels": dict(key), "value": child.value}
+                    if kind == "counter"
+                    else {
+                        "labels": dict(key),
+                        "buckets": dict(zip([str(b) for b in child.bounds] + ["+Inf"], child.cumulative())),
+                        "sum": child.sum,
+                        "count": child.count,
+                    }
+                    for key, child in sorted(children.items())
+                ]
+        return content
+
+
+METRICS = MetricsRegistry()  # the registry of this process, used by every module
+
+
+def serve_metrics(registry: MetricsRegistry, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serves GET /metrics in Prometheus text format, from a daemon thread, until shutdown() is called
+
+    :return: the running server
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_args):  # scrapes are not worth a line in the console
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class MetricsDumper:
+    """ Writes the JSON snapshot of a registry every `interval` seconds, and once more when stopped """
+
+    __slots__ = ["registry", "filename", "interval", "stopped", "thread"]
+
+    def __init__(self, registry: MetricsRegistry, filename: str, interval: float = 60):
+        self.registry = registry
+        self.filename = filename
+        self.interval = interval
+        self.stopped = Event()
+        self.thread = Thread(target=self._run, name="metrics-dump", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        atomic_write(self.filename, json.dumps(self.registry.snapshot(), indent=1).encode("utf-8"))
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.dump()
@@ -0,0 +1,110 @@
+#! python3
+"""
+MIT License
+
+Copyright (c) 2020 Walter Wlodarski
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import atexit
+import json
+import logging
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s : %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Hands records over to the writer thread as they are: even merging the message with its arguments happens there.
+    Arguments must therefore not be modified after the logging call.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:  # tracebacks hold live frames, render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per line: time, level, thread, message (and exception, if any) """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class Lazy:
+    """
+    | Deferred str(), for costly logging arguments. Only computed if the record is ever formatted
+    |
+    |   logging.debug("%s", Lazy(pretty_polyid, polynomial=poly))
+    """
+
+    __slots__ = ["function", "args", "kwargs"]
+
+    def __init__(self, function, *args, **kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.function(*self.args, **self.kwargs))
+
+
+def start_queued_logging(filename: str, level=logging.INFO, json_format: bool = False, max_bytes: int = 0, backups=3):
+    """
+    Root logging goes through a queue to a background writer thread: logging calls only enqueue records.
+
+    :param filename: log file
+    :param json_format: JSON lines instead of text lines
+    :param max_bytes: 0 = the file is overwritten at every run, otherwise it is appended to and rotated at that size
+    :param backups: rotated files kept (filename.1, filename.2, ...)
+    :return: the running QueueListener, stopped (and drained) at exit
+    """
+    handler = RotatingFileHandler(
+        filename, mode="a" if max_bytes else "w", maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+    )
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+
+    queue = SimpleQueue()
+    root = logging.getLogger()
+    for previous in root.handlers[:]:
+        root.removeHandler(previous)
+    root.addHandler(DeferredQueueHandler(queue))
+    root.setLevel(level)
+
+    listener = QueueListener(queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
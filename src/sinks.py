@@ -0,0 +1,275 @@
+#! python3
+"""
+MIT License
+
+Copyright (c) 2020 Walter Wlodarski
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import logging
+import sys
+import traceback
+from concurrent.futures import Future
+from contextvars import copy_context
+from io import BytesIO
+from pathlib import Path
+from queue import Full, Queue
+from threading import Thread
+from time import perf_counter
+from urllib.request import Request, urlopen
+
+from metrics import METRICS
+from utils import atomic_write, print80
+
+
+class RunResult:
+    """
+    Everything the sinks may publish about one run. It is handed over as soon as the text table is ready:
+    the graph still renders meanwhile, and image() waits for it (in the sink's own thread)
+    """
+
+    __slots__ = ["station", "elevation", "fix_hour", "table", "rows", "steps", "image_format", "_image"]
+
+    def __init__(self, station, elevation, fix_hour, table: str, rows: list, steps: tuple, image_format: str, image):
+        """
+        :param table: text table, as displayed
+        :param rows: table rows, as txttable.row_dict()
+        :param steps: PolynomialCurveFit.steps, ([times], [steps])
+        :param image_format: ex) "png"
+        :param image: image content, or a Future of it
+        """
+        self.station = station
+        self.elevation = elevation
+        self.fix_hour = fix_hour
+        self.table = table
+        self.rows = rows
+        self.steps = steps
+        self.image_format = image_format
+        self._image = image
+
+    def image(self, timeout: float = None) -> bytes:
+        return self._image.result(timeout) if isinstance(self._image, Future) else self._image
+
+    def name(self) -> str:
+        return "{}-{:}".format(self.station, self.fix_hour.strftime("%Y%m%d-%H%M")).replace(" ", "_")
+
+    def document(self) -> dict:
+        """ JSON-ready summary, without the image """
+        times, steps = self.steps
+        return {
+            "station": self.station,
+            "elevation": self.elevation,
+            "fix_time": self.fix_hour.isoformat(timespec="minutes"),
+            "rows": self.rows,
+            "steps": [{"time": t.isoformat(timespec="minutes"), "step": s} for t, s in zip(times, steps)],
+        }
+
+
+class OutputSink:
+    """ Receives each RunResult once, in its own thread (see SinkFanOut) """
+
+    name = "sink"
+
+    def deliver(self, result: RunResult):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FileSink(OutputSink):
+    """ The image, written atomically to a path computed per result (the autosave) """
+
+    name = "file"
+
+    def __init__(self, path_of):
+        """ :param path_of: callable, RunResult -> file path """
+        self.path_of = path_of
+
+    def deliver(self, result: RunResult):
+        atomic_write(self.path_of(result), result.image())
+
+
+class DirectoryDropSink(OutputSink):
+    """
+    A drop folder for other programs: <station>-<fix time>.<image format>, then <station>-<fix time>.json.
+    Both appear complete (atomic writes) and the JSON comes last, so watchers can wait for it.
+    """
+
+    name = "drop"
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+    def deliver(self, result: RunResult):
+        atomic_write(self.folder / "{}.{}".format(result.name(), result.image_format), result.image())
+        atomic_write(self.folder / "{}.json".format(result.name()), json.dumps(result.document()).encode("utf-8"))
+
+
+class StdoutJsonSink(OutputSink):
+    """ One JSON document per result, on one line of the real standard output """
+
+    name = "json"
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.__stdout__
+
+    def deliver(self, result: RunResult):
+        self.stream.write(json.dumps(result.document()) + "\n")
+        self.stream.flush()
+
+
+class WebhookSink(OutputSink):
+    """ POSTs the JSON document to a (local) webhook, ex) http://127.0.0.1:8080/altimeter """
+
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, result: RunResult):
+        request = Request(
+            self.url,
+            data=json.dumps(result.document()).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class SlackSink(OutputSink):
+    """ The text table as soon as it is there, then the image once rendered """
+
+    name = "slack"
+
+    def __init__(self, client, channel: str):
+        """ :param client: slack.WebClient """
+        self.client = client
+        self.channel = channel
+
+    def deliver(self, result: RunResult):
+        _title = result.name()
+        _comment = "{} ({}m)\n\n".format(result.station, result.elevation)
+        print80(_("Sending timetable to Slack channel {}").format(self.channel))
+        self._upload(
+            "table",
+            content=result.table,
+            channels=self.channel,
+            title=_title,
+            filename=_title + ".txt",
+            initial_comment=_comment,
+        )
+        _filename = _title + "." + result.image_format
+        _image = result.image()
+        print80(_("Sending {} to Slack channel {}").format(_filename, self.channel))
+        self._upload(
+            "image",
+            file=BytesIO(_image),
+            channels=self.channel,
+            title=_title,
+            filename=_filename,
+            initial_comment=_comment,
+        )
+
+    def _upload(self, kind: str, **upload_kwargs):
+        try:
+            with METRICS.timer("slack_upload_seconds", "Slack upload latency", kind=kind):
+                _response = self.client.files_upload(**upload_kwargs)
+            if not _response["ok"]:
+                raise IOError(_("Sending to Slack failed"))
+        except Exception:
+            METRICS.inc("slack_upload_failures_total", "Failed Slack uploads", kind=kind)
+            raise
+
+
+SINKS = {sink.name: sink for sink in [FileSink, DirectoryDropSink, StdoutJsonSink, WebhookSink, SlackSink]}
+
+
+class SinkFanOut:
+    """
+    | Hands each result to every sink, once. Each sink runs in its own thread behind a bounded queue :
+    |   - a slow sink never holds the others up
+    |   - publish() only waits when the queue of a sink is full (backpressure), at most put_timeout seconds.
+    |     Past that, the result is dropped for that sink only
+    | A failing sink is logged and counted, and keeps receiving the next results.
+    | Each result is delivered in the context it was published from, so in the language of the caller.
+    """
+
+    __slots__ = ["sinks", "queues", "threads", "put_timeout", "stats", "started", "timings"]
+
+    _STOP = object()
+
+    def __init__(self, sinks: list, queue_size: int = 4, put_timeout: float = 60):
+        self.sinks = sinks
+        self.queues = [Queue(maxsize=queue_size) for _sink in sinks]
+        self.put_timeout = put_timeout
+        self.stats = {sink.name: {"delivered": 0, "failed": 0, "dropped": 0} for sink in sinks}
+        self.started = perf_counter()
+        self.timings = {}  # sink name -> milliseconds from the start of the fan-out to the end of its last delivery
+        self.threads = [
+            Thread(target=self._run, args=(sink, queue), name="sink-" + sink.name, daemon=True)
+            for sink, queue in zip(sinks, self.queues)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self, sink: OutputSink, queue: Queue):
+        while True:
+            item = queue.get()
+            if item is self._STOP:
+                break
+            context, result = item
+            try:
+                context.run(sink.deliver, result)
+                self._count(sink, "delivered")
+            except Exception:
+                self._count(sink, "failed")
+                logging.error("{} sink\n{}".format(sink.name, traceback.format_exc()))
+                print80(_("Output to {} failed").format(sink.name))
+            self.timings[sink.name] = (perf_counter() - self.started) * 1000
+        sink.close()
+
+    def _count(self, sink: OutputSink, outcome: str):
+        self.stats[sink.name][outcome] += 1
+        METRICS.inc("sink_results_total", "Results handed to output sinks", sink=sink.name, outcome=outcome)
+
+    def publish(self, result: RunResult):
+        for sink, queue in zip(self.sinks, self.queues):
+            try:
+                queue.put((copy_context(), result), timeout=self.put_timeout)  # one copy per thread entering it
+            except Full:
+                self._count(sink, "dropped")
+                logging.error(_("Output to {} dropped, its queue is full").format(sink.name))
+
+    def close(self) -> dict:
+        """
+        Waits until every sink has delivered what it has been given
+
+        :return: {sink name: {'delivered': n, 'failed': n, 'dropped': n}}
+        """
+        for queue in self.queues:
+            queue.put(self._STOP)
+        for thread in self.threads:
+            thread.join()
+        return self.stats
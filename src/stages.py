@@ -0,0 +1,101 @@
+#! python3
+"""
+MIT License
+
+Copyright (c) 2020 Walter Wlodarski
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from time import perf_counter
+
+from translation import Translation
+
+
+def _install_translation(localedir, lang: str):
+    Translation().install(localedir, lang)
+
+
+def _in_language(lang: str, fn, *args, **kwargs):
+    """ fn(*args, **kwargs) translated in lang, ex) in the worker process, whatever language it started with """
+    with _.language(lang):
+        return fn(*args, **kwargs)
+
+
+def _transfer(source: Future, target: Future):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class StagedExecutor:
+    """
+    | Renders the graph off-screen in a worker process while the main program carries on, and settles the futures
+    | that wait for it (ex: the image of a RunResult, delivered by the sinks of a SinkFanOut as soon as it is there)
+    """
+
+    __slots__ = ["processes", "initargs", "futures", "started", "timings"]
+
+    def __init__(self, localedir=None, lang: str = ""):
+        """
+        :param localedir: gettext catalogs, so that worker processes translate like the main program
+        :param lang: language code of the main program, the default of the worker processes
+        """
+        self.processes = None  # started at the first render() only
+        self.initargs = (localedir, lang)
+        self.futures = []
+        self.started = perf_counter()
+        self.timings = {}  # stage name -> milliseconds from the start of the executor to the end of the stage
+
+    def _track(self, name: str, future: Future) -> Future:
+        def done(_future):
+            self.timings[name] = (perf_counter() - self.started) * 1000
+
+        future.add_done_callback(done)
+        self.futures.append(future)
+        return future
+
+    def render(self, name: str, fn, *args, **kwargs) -> Future:
+        """
+        fn(*args, **kwargs) in the worker process, in the language of the caller's context (see Translation.language)
+        fn and its arguments must be picklable
+        """
+        if self.processes is None:
+            self.processes = ProcessPoolExecutor(
+                max_workers=1, initializer=_install_translation, initargs=self.initargs
+            )
+        return self._track(name, self.processes.submit(_in_language, _.current_lang(), fn, *args, **kwargs))
+
+    @staticmethod
+    def forward(source: Future, target: Future):
+        """ Settles target with the outcome of source (result or exception), once known """
+        source.add_done_callback(lambda _done: _transfer(_done, target))
+
+    def shutdown(self):
+        """
+        Waits for every stage, then raises the first exception raised by any of them, if any
+        """
+        wait(self.futures)
+        if self.processes is not None:
+            self.processes.shutdown()
+        for future in self.futures:
+            if future.exception() is not None:
+                raise future.exception()
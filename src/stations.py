@@ -0,0 +1,136 @@
+#! python3
+"""
+MIT License
+
+Copyright (c) 2020 Walter Wlodarski
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import csv
+
+import numpy as np
+
+try:  # optional, the exhaustive search below is used without it
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+EARTH_RADIUS = 6371.0088  # km; mean radius
+BRUTE_FORCE_CELLS = 4_000_000  # queries x stations compared at once without scipy, about 32 MB
+
+
+def unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """
+    Positions on the unit sphere, where the nearest point by straight line is also the nearest by great circle
+
+    :param latitudes: decimal degrees
+    :param longitudes: decimal degrees
+    :return: n x 3 array
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+class StationIndex:
+    """
+    | Offline nearest weather station lookup, built once from a station list.
+    |
+    | CSV columns: name, latitude, longitude, url (hourly forecast page)
+    """
+
+    __slots__ = ["names", "urls", "vectors", "tree"]
+
+    def __init__(self, names: list, latitudes: list, longitudes: list, urls: list):
+        if not names:
+            raise ValueError("Empty station list")
+        self.names = list(names)
+        self.urls = list(urls)
+        self.vectors = unit_vectors(latitudes, longitudes)
+        self.tree = cKDTree(self.vectors) if cKDTree is not None else None
+
+    @classmethod
+    def from_csv(cls, filename: str):
+        names, latitudes, longitudes, urls = [], [], [], []
+        with open(filename, newline="", encoding="utf-8") as csv_file:
+            for row in csv.DictReader(csv_file):
+                names.append(row["name"].strip())
+                latitudes.append(float(row["latitude"]))
+                longitudes.append(float(row["longitude"]))
+                urls.append(row["url"].strip())
+        return cls(names, latitudes, longitudes, urls)
+
+    def __len__(self):
+        return len(self.names)
+
+    def nearest_many(self, latitudes, longitudes):
+        """
+        :param latitudes: decimal degrees
+        :param longitudes: decimal degrees
+        :return: (indexes of the nearest stations, distances in km)
+        """
+        queries = unit_vectors(latitudes, longitudes)
+        if self.tree is not None:
+            chords, indexes = self.tree.query(queries)
+        else:
+            # |a - b|² = 2 - 2 a·b on the unit sphere: the nearest station has the largest dot product
+            indexes = np.empty(len(queries), dtype=int)
+            best = np.empty(len(queries))
+            chunk = max(1, BRUTE_FORCE_CELLS // len(self.vectors))
+            for first in range(0, len(queries), chunk):
+                dots = queries[first : first + chunk] @ self.vectors.T
+                indexes[first : first + chunk] = np.argmax(dots, axis=1)
+                best[first : first + chunk] = dots[np.arange(len(dots)), indexes[first : first + chunk]]
+            chords = np.sqrt(np.maximum(2 - 2 * best, 0))
+        return np.asarray(indexes), chord_to_km(chords)
+
+    def nearest(self, latitude: float, longitude: float):
+        """
+        :param latitude: decimal degrees
+        :param longitude: decimal degrees
+        :return: (station name, hourly forecast url, distance in km)
+        """
+        indexes, distances = self.nearest_many([latitude], [longitude])
+        return self.names[indexes[0]], self.urls[indexes[0]], float(distances[0])
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+
+    rng = np.random.default_rng(0)
+    n = 20000
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    lon = rng.uniform(-180, 180, n)
+    index = StationIndex([f"S{i}" for i in range(n)], lat, lon, [f"url{i}" for i in range(n)])
+
+    start = perf_counter()
+    for _i in range(1000):
+        index.nearest(45.37, -72.15)
+    print(f"single query: {(perf_counter() - start) * 1000:.1f} µs ({'k-d tree' if index.tree else 'numpy'})")
+
+    q_lat, q_lon = rng.uniform(-80, 80, 10000), rng.uniform(-180, 180, 10000)
+    start = perf_counter()
+    found, km = index.nearest_many(q_lat, q_lon)
+    elapsed = (perf_counter() - start) * 1000
+    print(f"batch of {len(q_lat)} queries: {elapsed:.1f} ms, median distance {np.median(km):.0f} km")
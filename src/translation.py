@@ -23,12 +23,26 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import builtins
 import gettext
+from contextlib import contextmanager
+from contextvars import ContextVar
 from locale import getdefaultlocale
 
+from metrics import METRICS
+
+_context_lang = ContextVar("lang", default=None)  # language requested by the current thread or task, if any
+
 
 class Translation:
-    __slots__ = ["gettext"]
+    """
+    | Callable used as _() by every module.
+    |
+    | Each catalog (.mo) is loaded once and cached. The language is looked up at every call, in the current context,
+    | so one long-lived process can serve several languages at once: see language().
+    """
+
+    __slots__ = ["gettext", "localedir", "locale", "catalogs", "lang"]
 
     @staticmethod
     def temporary_(message):
@@ -36,16 +50,136 @@ class Translation:
 
     def __init__(self):
         self.gettext = self.temporary_
+        self.localedir = None
+        self.locale = None
+        self.catalogs = {}
+        self.lang = ""
 
     def __call__(self, text):
-        return self.gettext(text)
+        lang = _context_lang.get()
+        if lang is None or self.localedir is None:
+            return self.gettext(text)
+        return self.catalog(lang).gettext(text)
+
+    def catalog(self, lang: str):
+        """
+        :param lang: language code, ex) 'fr'. Unknown languages fall back to the OS locale, then to English
+        :return: gettext catalog, loaded at first use only
+        """
+        try:
+            found = self.catalogs[lang]
+            METRICS.inc("cache_lookups_total", "Cache lookups", cache="translation", result="hit")
+            return found
+        except KeyError:
+            METRICS.inc("cache_lookups_total", "Cache lookups", cache="translation", result="miss")
+            chosen_lang = gettext.translation(
+                "DR-Altimeter", localedir=self.localedir, languages=[lang, self.locale], fallback=True,
+            )
+            return self.catalogs.setdefault(lang, chosen_lang)
 
     def set_lang(self, clp):
-        current_locale, encoding = getdefaultlocale()
-        lang = clp.args.lang if clp.args.lang in clp.all_lang else ""
-        chosen_lang = gettext.translation(
-            "DR-Altimeter", localedir=clp.localedir, languages=[lang, current_locale], fallback=True,
-        )
-        chosen_lang.install()
-        self.gettext = chosen_lang.gettext
+        """
+        Sets the default language, from the command line or the OS locale, and installs _() for all modules
+        """
+        return self.install(clp.localedir, clp.args.lang if clp.args.lang in clp.all_lang else "")
+
+    def install(self, localedir, lang: str = ""):
+        """
+        Same as set_lang(), without a command line, ex) in a worker process started by the main program
+        """
+        self.locale, encoding = getdefaultlocale()
+        self.localedir = localedir
+        self.lang = lang
+        builtins._ = self  # modules look _ up at call time, so they follow the language of the current context
+        self.gettext = self.catalog(lang).gettext
         return self.gettext
+
+    def current_lang(self) -> str:
+        """
+        :return: language of the current context, or the default language outside any language() block
+        """
+        lang = _context_lang.get()
+        return self.lang if lang is None else lang
+
+    @contextmanager
+    def language(self, lang: str = None):
+        """
+        | Translates in lang everything done within the block, in this thread or task, and what it hands over :
+        |   - results published to a SinkFanOut, delivered in the sink threads (ex: Slack messages)
+        |   - renders started with StagedExecutor.render(), in the worker process (ex: graph labels)
+        |
+        |   with _.language("fr"):
+        |       ... (table, graph labels, Slack messages)
+
+        :param lang: language code, None = keep the current language
+        """
+        if lang is None:
+            yield self
+            return
+        token = _context_lang.set(lang)
+        try:
+            yield self
+        finally:
+            _context_lang.reset(token)
+
+
+def _translated(text: str) -> str:
+    """ _(text), picklable, for the check below """
+    return _(text)
+
+
+if __name__ == "__main__":
+    # Two languages in one process: threads, sink threads and the render worker each follow their caller
+    #   python translation.py    (needs the compiled catalogs, locales/<lang>/LC_MESSAGES/DR-Altimeter.mo)
+    import sys
+    from datetime import datetime
+    from pathlib import Path
+    from threading import Barrier, Thread
+
+    from sinks import OutputSink, RunResult, SinkFanOut
+    from stages import StagedExecutor
+
+    message = "Fix at {}"
+    localedir = Path(__file__).resolve().parent / "locales"
+    translation = Translation()
+    translation.install(localedir, "en")
+    expected = {lang: translation.catalog(lang).gettext(message) for lang in ["en", "fr"]}
+    if expected["en"] == expected["fr"]:
+        sys.exit(f"no French catalog in {localedir}: compile the .po files first")
+
+    found = {}
+    barrier = Barrier(2)
+
+    def in_thread(lang):
+        with translation.language(lang):
+            barrier.wait()  # both threads are in their own language at the same time
+            found["thread", lang] = _(message)
+
+    threads = [Thread(target=in_thread, args=(lang,)) for lang in expected]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    class RecordingSink(OutputSink):
+        name = "recording"
+
+        def deliver(self, result: RunResult):
+            found["sink", result.station] = _(message)
+
+    sinks = SinkFanOut([RecordingSink()])
+    stages = StagedExecutor(localedir=localedir, lang="en")
+    renders = {}
+    for lang in expected:
+        with translation.language(lang):
+            sinks.publish(RunResult(lang, 0, datetime.now(), "", [], ([], []), "png", b""))
+            renders[lang] = stages.render(lang, _translated, message)
+    sinks.close()
+    stages.shutdown()
+    for lang, rendered in renders.items():
+        found["render", lang] = rendered.result()
+
+    for (where, lang), text in sorted(found.items()):
+        print(f"{where:6} {lang}: {text}")
+    assert all(text == expected[lang] for (where, lang), text in found.items()) and len(found) == 6
+    print("Each language followed its caller")
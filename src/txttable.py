@@ -23,29 +23,78 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import csv
+import json
+from textwrap import wrap
+
+
+def _number(value):
+    """ Plain float for machine outputs, or None when the cell is empty """
+    return None if value is None else float(value)
+
+
+def row_dict(hour: int, minute: int, pressure: float, alt: float = None, alt_h: float = None, times=()) -> dict:
+    """ One table row, as machine outputs (JSON rows, output sinks) publish it """
+    return {
+        "hour": int(hour),
+        "minute": int(minute),
+        "pressure": _number(pressure),
+        "alt": _number(alt),
+        "alt_h": _number(alt_h),
+        "times": [t for t in ", ".join(times).split(", ") if t],
+    }
+
 
 class PredictionTable:
-    __slots__ = ["table"]
+    """
+    Fixed 5-column text table, rendered row by row as it is filled.
+    Same layout as texttable with HEADER | HLINES decoration, without measuring the cells again on display.
+    """
 
-    def __init__(self):
-        from texttable import Texttable
+    __slots__ = ["lines", "rows", "stream"]
 
-        self.table = Texttable()
-        self.table.set_deco(Texttable.HEADER | Texttable.HLINES)
-        self.table.set_cols_dtype(["t", "t", "t", "t", "t"])
-        self.table.set_cols_align(["c", "r", "r", "r", "l"])
-        self.table.set_cols_valign(["t", "t", "t", "t", "m"])
-        self.table.header([_("H"), _("PRESSURE"), _("ALT"), _("ALT/hr"), ""])
-        self.table.set_cols_width([5, 11, 7, 6, 38])  # total width = 80 (with added borders)
+    WIDTHS = [5, 11, 7, 6, 38]  # total width = 80 (with added borders)
+    ALIGN = ["c", "r", "r", "r", "l"]
+    SEPARATOR = "   "
+    WIDTH = sum(WIDTHS) + len(SEPARATOR) * (len(WIDTHS) - 1)
+
+    def __init__(self, stream=None):
+        """
+        :param stream: optional row writer (JsonRowWriter, CsvRowWriter) receiving every row as soon as it is added
+        """
+        self.lines = []
+        self.rows = []  # the same rows as row_dict(), for output sinks
+        self.stream = stream
+        self._draw_row([_("H"), _("PRESSURE"), _("ALT"), _("ALT/hr"), ""], align=["c"] * len(self.WIDTHS))
+        self.lines.append("=" * self.WIDTH)
+
+    def _draw_row(self, cells: list, align: list) -> None:
+        wrapped = [wrap(cell, width) or [""] for cell, width in zip(cells, self.WIDTHS)]
+        for index in range(max(map(len, wrapped))):
+            line = []
+            for cell_lines, width, how in zip(wrapped, self.WIDTHS, align):
+                text = cell_lines[index] if index < len(cell_lines) else ""
+                if how == "c":  # odd padding goes to the right, as with texttable
+                    line.append(text.rjust(len(text) + (width - len(text)) // 2).ljust(width))
+                elif how == "r":
+                    line.append(text.rjust(width))
+                else:
+                    line.append(text.ljust(width))
+            self.lines.append(self.SEPARATOR.join(line))
 
     def _add(self, hour: str, pressure: str, alt: str = "", alt_h: str = "", times: str = ""):
-        return self.table.add_row([hour, pressure, alt, alt_h, times])
+        if len(self.lines) > 2:
+            self.lines.append("-" * self.WIDTH)
+        self._draw_row([hour, pressure, alt, alt_h, times], align=self.ALIGN)
 
     def add_start(self, hour: int, minute: int, pressure: float, times: iter):
         _h = "{:d}h{:02d}".format(int(hour), int(minute))
         _p = "{:.2f} hPa".format(float(pressure))
         _t = ", ".join(times)
 
+        self.rows.append(row_dict(hour=hour, minute=minute, pressure=pressure, times=times))
+        if self.stream is not None:
+            self.stream.write_row(hour=hour, minute=minute, pressure=pressure, times=times)
         return self._add(hour=_h, pressure=_p, times=_t)
 
     def add(self, hour: int, pressure: float, alt: float, alt_h: float, times: iter) -> int:
@@ -55,7 +104,58 @@ class PredictionTable:
         _ah = "{:.1f}m".format(alt_h) if type(alt) is float else ""
         _t = ", ".join(times)
 
+        self.rows.append(row_dict(hour=hour, minute=0, pressure=pressure, alt=alt, alt_h=alt_h, times=times))
+        if self.stream is not None:
+            self.stream.write_row(hour=hour, minute=0, pressure=pressure, alt=alt, alt_h=alt_h, times=times)
         return self._add(hour=_h, pressure=_p, alt=_a, alt_h=_ah, times=_t)
 
     def display_table(self):
-        return self.table.draw()
+        return "\n".join(self.lines)
+
+
+class JsonRowWriter:
+    """
+    Writes one JSON object per row (JSON Lines), flushed immediately, for machine consumers
+    """
+
+    __slots__ = ["file", "tag"]
+
+    def __init__(self, file, tagged: bool = False):
+        """
+        :param tagged: rows start with the station and run set in tag, when several runs share the output
+        """
+        self.file = file
+        self.tag = {"station": "", "run": ""} if tagged else None
+
+    def write_row(self, hour: int, minute: int, pressure: float, alt: float = None, alt_h: float = None, times=()):
+        row = row_dict(hour, minute, pressure, alt, alt_h, times)
+        self.file.write(json.dumps(row if self.tag is None else {**self.tag, **row}) + "\n")
+        self.file.flush()
+
+
+class CsvRowWriter:
+    """
+    Writes one CSV line per row, after a header line, flushed immediately, for machine consumers
+    """
+
+    __slots__ = ["file", "writer", "tag"]
+
+    FIELDS = ["hour", "minute", "pressure", "alt", "alt_h", "times"]
+
+    def __init__(self, file, tagged: bool = False):
+        """
+        :param tagged: rows start with the station and run set in tag, when several runs share the output
+        """
+        self.file = file
+        self.writer = csv.writer(file, lineterminator="\n")
+        self.tag = {"station": "", "run": ""} if tagged else None
+        self.writer.writerow((list(self.tag) if tagged else []) + self.FIELDS)
+
+    def write_row(self, hour: int, minute: int, pressure: float, alt: float = None, alt_h: float = None, times=()):
+        cells = [int(hour), int(minute), _number(pressure), _number(alt), _number(alt_h)]
+        cells.append(", ".join(t for t in times if t))
+        self.writer.writerow(cells if self.tag is None else list(self.tag.values()) + cells)
+        self.file.flush()
+
+
+ROW_WRITERS = {"json": JsonRowWriter, "csv": CsvRowWriter}
@@ -127,24 +127,79 @@ def filter_by_hour(list_of_times: list, *, hr: datetime) -> filter:
     return filter(in_same_hour, list_of_times)
 
 
-def cleanup_mei():
+def _remove_tree(path: str, deadline: float = None) -> bool:
     """
-    Rudimentary workaround for https://github.com/pyinstaller/pyinstaller/issues/2379
+    Removes a folder file by file, bottom-up, checking the deadline between files
+
+    :param path: folder
+    :param deadline: perf_counter() value, None = no limit
+    :return: True if the folder is gone, False if the deadline stopped it (what remains is removed next time)
+    """
+    import os
+    from time import perf_counter
+
+    for root, dirs, files in os.walk(path, topdown=False):
+        for name in files:
+            if deadline is not None and perf_counter() > deadline:
+                return False
+            os.unlink(os.path.join(root, name))
+        for name in dirs:
+            _dir = os.path.join(root, name)
+            if os.path.islink(_dir):  # os.walk lists symlinks to folders as folders
+                os.unlink(_dir)
+            else:
+                os.rmdir(_dir)
+    os.rmdir(path)
+    return True
+
+
+def cleanup_mei(budget: float = None) -> int:
+    """
+    | Rudimentary workaround for https://github.com/pyinstaller/pyinstaller/issues/2379
+    |
+    | Removes the _MEI folders left in the temp folder by previous one-file runs. With a budget, stops
+    | within about one file deletion of that many seconds and leaves the rest to the next run.
+
+    :param budget: seconds, None = no limit
+    :return: number of folders removed
     """
     import sys
     import os
-    from shutil import rmtree
+    from time import perf_counter
 
-    mei_bundle = getattr(sys, "_MEIPASS", False)
+    dir_mei, current_mei = os.path.split(os.path.normpath(getattr(sys, "_MEIPASS", "")))
+    if not current_mei.startswith("_MEI"):  # not frozen, or one-dir build: nothing was extracted
+        return 0
 
-    if mei_bundle:
-        dir_mei, current_mei = mei_bundle.split("_MEI")
-        for file in os.listdir(dir_mei):
-            if file.startswith("_MEI") and not file.endswith(current_mei):
+    deadline = None if budget is None else perf_counter() + budget
+    removed = 0
+    with os.scandir(dir_mei) as entries:
+        for entry in entries:
+            if deadline is not None and perf_counter() > deadline:
+                break
+            if entry.name.startswith("_MEI") and entry.name != current_mei and entry.is_dir(follow_symlinks=False):
                 try:
-                    rmtree(os.path.join(dir_mei, file))
+                    if _remove_tree(entry.path, deadline):
+                        removed += 1
                 except PermissionError:  # mainly to allow simultaneous pyinstaller instances
                     pass
+    return removed
+
+
+def cleanup_mei_in_background(budget: float = 5.0):
+    """
+    | Runs cleanup_mei in a daemon thread, so that startup no longer grows with the number of stale bundles.
+    |
+    | A cleanup cut short by the budget or by the end of the program resumes at the next run.
+
+    :param budget: seconds
+    :return: the started thread
+    """
+    from threading import Thread
+
+    thread = Thread(target=cleanup_mei, kwargs={"budget": budget}, name="cleanup_mei", daemon=True)
+    thread.start()
+    return thread
 
 
 def full_hour(dt: datetime) -> datetime:
@@ -152,3 +207,93 @@ def full_hour(dt: datetime) -> datetime:
     Truncates datetime to full hour, <date>14h34:13 -> <date>14h00:00
     """
     return dt.replace(microsecond=0, second=0, minute=0)
+
+
+def output_path(template: str, **fields) -> str:
+    """
+    | Fills the placeholders of an output filename, ex) graph-{station}-{fix_time}-{pid}.png
+    |
+    | Values are made safe for file names. Unknown placeholders are left untouched.
+
+    :param template: filename, possibly with {placeholders}
+    :param fields: placeholder values, ex) station='Orford', pid=1234
+    :return: filename
+    """
+    import re
+
+    safe = {key: re.sub(r"[^\w.-]+", "_", str(value)).strip("_") for key, value in fields.items()}
+    return re.sub(r"{(\w+)}", lambda m: safe.get(m.group(1), m.group(0)), template)
+
+
+def atomic_write(filename: str, data: bytes) -> None:
+    """
+    Writes to a unique temporary file in the same folder, then renames it over filename,
+    so that concurrent instances never see, upload or overwrite a partially written file
+    """
+    import os
+    from tempfile import NamedTemporaryFile
+
+    folder = os.path.dirname(os.path.abspath(filename))
+    prefix = os.path.basename(filename) + "."
+    with NamedTemporaryFile("wb", dir=folder, prefix=prefix, suffix=".tmp", delete=False) as tmp:
+        try:
+            tmp.write(data)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    try:
+        os.replace(tmp.name, filename)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+
+
+if __name__ == "__main__":
+    # Startup benchmark of a frozen build, from exec to the first console output
+    #   python utils.py dist/DR-Altimeter --version                 (one-file)
+    #   python utils.py dist/DR-Altimeter/DR-Altimeter --version    (one-dir)
+    # Each run is repeated with stale _MEI bundles in the temp folder, which must not slow it down.
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    from shutil import rmtree
+    from statistics import median
+    from time import perf_counter
+
+    if len(sys.argv) < 2:
+        sys.exit(f"usage: {sys.argv[0]} executable [arguments...]")
+    command = sys.argv[1:]
+    runs, stale, files_per_bundle = 7, 50, 200
+
+    def first_output() -> float:
+        start = perf_counter()
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT) as process:
+            process.stdout.read(1)
+            elapsed = perf_counter() - start
+            process.stdout.read()
+        return elapsed
+
+    bundles = []
+
+    def make_stale_bundles():
+        for _i in range(stale):
+            bundle = tempfile.mkdtemp(prefix="_MEI")
+            bundles.append(bundle)
+            for n in range(files_per_bundle):
+                with open(os.path.join(bundle, f"{n}.pyd"), "wb") as f:
+                    f.write(b"\0" * 4096)
+
+    first_output()  # warms up the disk cache
+    clean = median(first_output() for _i in range(runs))
+    timings = []
+    for _i in range(runs):
+        make_stale_bundles()
+        timings.append(first_output())
+    with_stale = median(timings)
+    print(f"first output: {clean * 1000:.0f} ms, with {stale} stale bundles: {with_stale * 1000:.0f} ms")
+    leftovers = [bundle for bundle in bundles if os.path.exists(bundle)]
+    print(f"{len(bundles) - len(leftovers)} of {len(bundles)} stale bundles removed by the program")
+    for bundle in leftovers:  # one-dir builds never remove them
+        rmtree(bundle)
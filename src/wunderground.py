@@ -0,0 +1,322 @@
+#! python3
+"""
+MIT License
+
+Copyright (c) 2020 Walter Wlodarski
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from datetime import datetime
+from html.parser import HTMLParser
+from re import findall, search
+
+# Locations of the values scraped on the hourly forecast page
+STATION_NAME_XPATH = '//*[@id="inner-content"]/div[2]/lib-city-header/div[1]/div/div/a[1]'
+STATION_HEADER_XPATH = '//*[@id="inner-content"]/div[2]/lib-city-header/div[1]/div/h1'
+STATION_ELEVATION_XPATH = '//*[@id="inner-content"]/div[2]/lib-city-header/div[1]/div/span/span/strong'
+STATION_ELEVATION_LINE_XPATH = '//*[@id="inner-content"]/div[2]/lib-city-header/div[1]/div/span/span'
+PRESSURE_XPATH = (
+    '//*[@id="inner-content"]/div[3]/div[2]/div/div[1]'
+    "/div[1]/lib-additional-conditions/lib-item-box/div/"
+    "div[2]/div/div[1]/div[2]/lib-display-unit/span/span[1]"
+)
+APP_STATE_ID = "app-root-state"
+HOURLY_TABLE_ID = "hourly-forecast-table"
+OBS_TIME_PATTERN = "obsTimeLocal&q;:&q;(....-..-.. ..:..:..)&q;"
+
+# Runs inside the page and returns, in a single WebDriver round trip, everything the per-element path collects.
+# Missing elements are returned as null so that Python can apply the same fallbacks as with NoSuchElementException.
+EXTRACT_PAGE_SCRIPT = r"""
+var xpaths = arguments[0], state_id = arguments[1], table_id = arguments[2], obs_pattern = arguments[3];
+var text = function (xpath) {
+    var node = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    return node === null ? null : node.innerText.trim();
+};
+var page = {};
+for (var key in xpaths) {
+    page[key] = text(xpaths[key]);
+}
+var state = document.getElementById(state_id);
+var obs = state === null ? null : state.innerHTML.match(new RegExp(obs_pattern));
+page.obs_time = obs === null ? null : obs[1];
+var table = document.getElementById(table_id);
+page.rows = [];
+if (table !== null) {
+    var rows = table.querySelectorAll("tr");
+    for (var i = 0; i < rows.length; i++) {
+        page.rows.push(rows[i].innerText.replace(/\s+/g, " ").trim());
+    }
+}
+return page;
+"""
+
+
+def extract_page_arguments() -> list:
+    """
+    Arguments passed along with EXTRACT_PAGE_SCRIPT to execute_script()
+
+    :return: [xpaths by key, app state id, hourly table id, observation time pattern]
+    """
+    xpaths = {
+        "station": STATION_NAME_XPATH,
+        "header": STATION_HEADER_XPATH,
+        "elevation": STATION_ELEVATION_XPATH,
+        "elevation_line": STATION_ELEVATION_LINE_XPATH,
+        "pressure": PRESSURE_XPATH,
+    }
+    return [xpaths, APP_STATE_ID, HOURLY_TABLE_ID, OBS_TIME_PATTERN]
+
+
+class SavedPage(HTMLParser):
+    """
+    | Hourly forecast page saved to a file, read without a browser, ex) the pages in fixtures/
+    |
+    | extract() returns what EXTRACT_PAGE_SCRIPT returns for the live page. Only the XPaths of this module
+    | are understood: an element id followed by child steps such as div[2] or span.
+    """
+
+    VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "wbr"}
+    CELL_TAGS = {"td", "th"}  # innerText separates table cells
+
+    class Element:
+        def __init__(self, tag: str, attrs: dict, parent=None):
+            self.tag, self.attrs, self.parent = tag, attrs, parent
+            self.children, self.content = [], []  # content: texts and child elements, in document order
+
+        def text(self) -> str:
+            _parts = []
+            for item in self.content:
+                if isinstance(item, str):
+                    _parts.append(item)
+                else:
+                    _parts.append(" " + item.text() if item.tag in SavedPage.CELL_TAGS else item.text())
+            return "".join(_parts)
+
+        def iter(self):
+            yield self
+            for child in self.children:
+                yield from child.iter()
+
+    def __init__(self, html: str):
+        super().__init__()
+        self.root = self.Element(None, {})
+        self._current = self.root
+        self.feed(html)
+        self.close()
+
+    def handle_starttag(self, tag, attrs):
+        _element = self.Element(tag, dict(attrs), parent=self._current)
+        self._current.children.append(_element)
+        self._current.content.append(_element)
+        if tag not in self.VOID_TAGS:
+            self._current = _element
+
+    def handle_endtag(self, tag):
+        _element = self._current
+        while _element is not self.root and _element.tag != tag:
+            _element = _element.parent
+        if _element is not self.root:  # ignores stray end tags
+            self._current = _element.parent
+
+    def handle_data(self, data):
+        self._current.content.append(data)
+
+    def by_id(self, element_id: str):
+        return next((_e for _e in self.root.iter() if _e.attrs.get("id") == element_id), None)
+
+    def by_xpath(self, xpath: str):
+        """
+        :param xpath: ex) '//*[@id="inner-content"]/div[2]/lib-city-header/div[1]/div/h1'
+        :return: first matching element, or None
+        """
+        _st = search(r'^//\*\[@id="([^"]+)"\]((?:/[\w-]+(?:\[[0-9]+\])?)*)$', xpath)
+        if _st is None:
+            return None
+        _elements = [self.by_id(_st.group(1))]
+        for tag, position in findall(r"/([\w-]+)(?:\[([0-9]+)\])?", _st.group(2)):
+            _next = []
+            for _element in filter(None, _elements):
+                _same_tag = [_child for _child in _element.children if _child.tag == tag]
+                _next += _same_tag if not position else _same_tag[int(position) - 1 : int(position)]
+            _elements = _next
+        return next(filter(None, _elements), None)
+
+    def extract(self) -> dict:
+        """
+        :return: same keys as EXTRACT_PAGE_SCRIPT, missing elements as None
+        """
+        xpaths, state_id, table_id, obs_pattern = extract_page_arguments()
+        _page = {}
+        for key, xpath in xpaths.items():
+            _element = self.by_xpath(xpath)
+            _page[key] = None if _element is None else " ".join(_element.text().split())
+        _state = self.by_id(state_id)
+        _obs = search(obs_pattern, _state.text()) if _state is not None else None
+        _page["obs_time"] = None if _obs is None else _obs.group(1)
+        _table = self.by_id(table_id)
+        _rows = [_e for _e in _table.iter() if _e.tag == "tr"] if _table is not None else []
+        _page["rows"] = [" ".join(_row.text().split()) for _row in _rows]
+        return _page
+
+
+# Requests the hourly table does not need: fonts, media, ads and trackers (comma separated, Chrome URL patterns)
+# fmt: off
+BLOCKED_URL_PATTERNS = ",".join(
+    [
+        "*.woff", "*.woff2", "*.ttf", "*.otf",
+        "*.mp4", "*.webm", "*.m3u8",
+        "*doubleclick.net*", "*googlesyndication.com*", "*googletagservices.com*", "*google-analytics.com*",
+        "*googletagmanager.com*", "*amazon-adsystem.com*", "*adnxs.com*", "*taboola.com*", "*outbrain.com*",
+        "*scorecardresearch.com*", "*chartbeat.net*", "*krxd.net*", "*jwpcdn.com*", "*jwplayer.com*",
+    ]
+)
+# fmt: on
+
+NEXT_FORECASTS_XPATH = '//*[@id="nextForecasts"]/span[2]/button'
+
+# Resolves as soon as the hourly table is in the page and contains the required text (if any).
+# With a button to click, the table must also differ from what it was before the click.
+# A MutationObserver wakes the script on every DOM change, so nothing is polled.
+WAIT_FOR_TABLE_SCRIPT = r"""
+var table_id = arguments[0], required = arguments[1], click_xpath = arguments[2];
+var done = arguments[arguments.length - 1];
+var content = function () {
+    var table = document.getElementById(table_id);
+    return table === null ? null : table.textContent;
+};
+var before = click_xpath === null ? null : content();
+var ready = function () {
+    var now = content();
+    return now !== null && now !== before && (required === null || now.indexOf(required) !== -1);
+};
+var observer = new MutationObserver(function () {
+    if (ready()) {
+        observer.disconnect();
+        done(true);
+    }
+});
+observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+if (click_xpath !== null) {
+    document.evaluate(click_xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue.click();
+}
+if (ready()) {
+    observer.disconnect();
+    done(true);
+}
+"""
+
+# fmt: off
+HPA_PER_INHG = 33.8638866667  # hPa; one inch of mercury
+METERS_PER_FOOT = 0.3048  # m; one international foot
+INHG_CEILING = 100  # 1100 hPa = 32.5 inHg and 260 hPa = 7.7 inHg, so any pressure below 100 is in inHg
+# fmt: on
+
+HOURLY_ROW_PATTERN = "^([0-9]+:00 [ap]m) .* ([0-9.,]+) ?(hPa|in)?$"
+
+
+def detect_pressure_unit(value: float) -> str:
+    """
+    :param value: pressure, either in hPa or inHg
+    :return: 'hPa' or 'in'
+    """
+    return "in" if value < INHG_CEILING else "hPa"
+
+
+def to_hectopascal(value: float, unit: str = None) -> float:
+    """
+    :param value: pressure in hPa or inHg
+    :param unit: 'hPa' or 'in', guessed from the magnitude of the value when missing
+    :return: pressure in hPa
+    """
+    if unit is None:
+        unit = detect_pressure_unit(value)
+    return value * HPA_PER_INHG if unit == "in" else value
+
+
+def to_meter(value: float, unit: str) -> float:
+    """
+    :param value: length in meters or feet
+    :param unit: 'm' or 'ft'
+    :return: length in meters
+    """
+    return value * METERS_PER_FOOT if unit == "ft" else value
+
+
+def elevation_unit(elevation_line: str, pressure_unit: str) -> str:
+    """
+    Unit of the station elevation, as displayed next to it
+
+    :param elevation_line: header text around the elevation, ex) 'Elev 840 ft, 45.37 °N, 72.15 °W'
+    :param pressure_unit: 'hPa' or 'in', used when the header does not show any unit
+    :return: 'm' or 'ft'
+    """
+    _st = search(r"[0-9] ?(ft|m)\b", elevation_line or "")
+    if _st is not None:
+        return _st.group(1)
+    return "ft" if pressure_unit == "in" else "m"
+
+
+def parse_hourly_row(row: str, date_str: str):
+    """
+    Hour and predicted pressure of one row of the hourly table, in metric or imperial units
+
+    :param row: text of the row, ex) '2:00 pm Cloudy 64 °F ... 30.05 in' or '2:00 pm Cloudy 18 °C ... 1,017.60 hPa'
+    :param date_str: date of the page, %Y-%m-%d
+    :return: (datetime, pressure in hPa)
+    """
+    _st = search(HOURLY_ROW_PATTERN, row)
+    hour = datetime.strptime(date_str + " " + _st.group(1), "%Y-%m-%d %I:%M %p")
+    pressure = float(_st.group(2).replace(",", ""))
+    return hour, to_hectopascal(pressure, _st.group(3))
+
+
+if __name__ == "__main__":
+    import os
+
+    # The same forecast, saved once with the metric toggle on and once in imperial units
+    _fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+    pages = {}
+    for system, pressure_unit, length_unit in [("metric", "hPa", "m"), ("imperial", "in", "ft")]:
+        with open(os.path.join(_fixtures, "hourly-{}.html".format(system)), encoding="utf-8") as f:
+            page = SavedPage(f.read()).extract()
+
+        current = float(page["pressure"].replace(",", ""))
+        assert detect_pressure_unit(current) == pressure_unit
+        assert elevation_unit(page["elevation_line"], pressure_unit="hPa") == length_unit
+        assert elevation_unit(None, pressure_unit=detect_pressure_unit(current)) == length_unit  # no unit shown
+        elevation = to_meter(float(page["elevation"].replace(",", "")), length_unit)
+
+        rows = [row for row in page["rows"] if not row.startswith("Time")]
+        assert rows and all(search(HOURLY_ROW_PATTERN, row).group(3) == pressure_unit for row in rows)
+        pages[system] = to_hectopascal(current), elevation, [parse_hourly_row(row, "2020-03-22") for row in rows]
+        unitless = [parse_hourly_row(row.rsplit(" ", 1)[0], "2020-03-22") for row in rows]  # unit guessed from value
+        assert unitless == pages[system][2]
+
+    metric_current, metric_elevation, metric_rows = pages["metric"]
+    imperial_current, imperial_elevation, imperial_rows = pages["imperial"]
+    inhg_rounding = 0.5 * 0.01 * HPA_PER_INHG  # inHg are shown with 2 decimals
+    assert abs(metric_current - imperial_current) < inhg_rounding
+    assert abs(metric_elevation - imperial_elevation) < 0.5 * METERS_PER_FOOT  # feet are shown as integers
+    assert len(metric_rows) == len(imperial_rows)
+    for (metric_hour, metric_hpa), (imperial_hour, imperial_hpa) in zip(metric_rows, imperial_rows):
+        assert metric_hour == imperial_hour
+        assert abs(metric_hpa - imperial_hpa) < inhg_rounding
+        print(f"{metric_hour:%H:%M}  {metric_hpa:8.2f} hPa  {imperial_hpa:8.2f} hPa")
+    print("Metric and imperial pages agree")